@@ -1,53 +1,168 @@
+import argparse
 import ast
-import os
-import sys
 import csv
-from typing import List, Dict
+import gzip
+import io
+import itertools
+from collections import deque
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional
 
-def infer_type(node):
-    """Infers type based on AST nodes."""
+import metrics
+from discovery import add_discovery_arguments, discover, iter_python_files
+from parallel import analyze_files
+from parse_cache import get_tree
+from records import AST_RECORDS, AST_REPORT, AnnotationRecord, stage_path, write_records
+from result_cache import ResultCache, add_cache_arguments, open_cache
+
+# Bump whenever the rows produced for a given source change, to invalidate cached results.
+ANALYZER_VERSION = "AST_Annotator/3"
+
+# Write buffer of the consolidated report, so it reaches the disk in large sequential chunks.
+REPORT_BUFFER_SIZE = 1024 * 1024
+
+# Large literals are typed from a sample: the first and last SAMPLE_SIZE elements,
+# taken alternately from both ends, stopping once STABLE_AFTER samples in a row
+# added no new type. Literals of up to 2 * SAMPLE_SIZE elements are inspected fully.
+SAMPLE_SIZE = 32
+STABLE_AFTER = 8
+
+# The nodes statements are nested in: other statements, except handlers and match cases.
+STATEMENT_NODES = (ast.stmt, ast.excepthandler, ast.match_case)
+
+def sample_indices(length, sample_size):
+    """Indices of the elements to inspect; every element unless the literal is larger than the sample."""
+    if not sample_size or length <= 2 * sample_size:
+        return range(length)
+    return (index for i in range(sample_size) for index in (i, length - 1 - i))
+
+class LiteralTypes:
+    """Element types of one List or Dict literal, gathered from its sampled children."""
+
+    def __init__(self, node, sample_size):
+        self.node = node
+        length = len(node.elts) if isinstance(node, ast.List) else len(node.keys)
+        self.sampled = bool(sample_size) and length > 2 * sample_size
+        self.children = self.iter_children(sample_indices(length, sample_size))
+        # One ordered set per slot: elements, or keys and values.
+        self.slots = ({},) if isinstance(node, ast.List) else ({}, {})
+        self.slot = None
+        self.child = None
+        self.unchanged = 0
+
+    def iter_children(self, indices):
+        for i in indices:
+            if isinstance(self.node, ast.List):
+                yield 0, self.node.elts[i]
+            else:
+                yield 0, self.node.keys[i]
+                yield 1, self.node.values[i]
+
+    def next_child(self):
+        """Moves to the next child to type; False once the sample is exhausted or stable."""
+        if self.sampled and self.unchanged >= STABLE_AFTER:
+            return False
+        self.slot, self.child = next(self.children, (None, None))
+        return self.slot is not None
+
+    def add(self, type_name):
+        types = self.slots[self.slot]
+        if type_name in types:
+            self.unchanged += 1
+        else:
+            types[type_name] = None
+            self.unchanged = 0
+
+    def type_name(self):
+        if isinstance(self.node, ast.List):
+            return f"List[{', '.join(self.slots[0])}]"
+        return f"Dict[{', '.join(self.slots[0])} : {', '.join(self.slots[1])}]"
+
+def infer_type(node, sample_size=SAMPLE_SIZE):
+    """Infers type based on AST nodes; sample_size=0 inspects every element of a literal."""
     if isinstance(node, ast.Constant):
         return type(node.value).__name__
-    elif isinstance(node, ast.List):
-        element_types = {infer_type(e) for e in node.elts}
-        return f"List[{', '.join(element_types)}]"
-    elif isinstance(node, ast.Dict):
-        key_types = {infer_type(k) for k in node.keys}
-        value_types = {infer_type(v) for v in node.values}
-        return f"Dict[{', '.join(key_types)} : {', '.join(value_types)}]"
-    return 'Unknown'
+    if not isinstance(node, (ast.List, ast.Dict)):
+        return 'Unknown'
 
-def analyze_code_for_types(file_path):
-    """Analyzes Python file for type hints and returns structured data."""
-    try:
-        with open(file_path, 'r') as file:
-            code = file.read()
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return []
+    # Walk nested literals with an explicit stack instead of recursing.
+    stack = [LiteralTypes(node, sample_size)]
+    while True:
+        literal = stack[-1]
+        if not literal.next_child():
+            stack.pop()
+            if not stack:
+                return literal.type_name()
+            stack[-1].add(literal.type_name())
+            continue
+        child = literal.child
+        if isinstance(child, (ast.List, ast.Dict)):
+            stack.append(LiteralTypes(child, sample_size))
+        elif isinstance(child, ast.Constant):
+            literal.add(type(child.value).__name__)
+        else:
+            literal.add('Unknown')
 
-    tree = ast.parse(code)
-    annotations = []
+def annotation_records(file_path, sample_size=SAMPLE_SIZE):
+    """Analyzes Python file for type hints and returns one AnnotationRecord per finding."""
+    with metrics.span("analyze", file_path, stage="AST"):
+        try:
+            tree = get_tree(file_path)
+        except (OSError, SyntaxError, UnicodeDecodeError) as e:
+            print(f"Error reading file: {e}")
+            return []
 
-    for node in ast.walk(tree):
+        with metrics.span("infer"):
+            return tree_records(file_path, tree, sample_size)
+
+def tree_records(file_path, tree, sample_size=SAMPLE_SIZE):
+    """Returns one AnnotationRecord per finding of an already parsed module."""
+    records = []
+
+    # Same breadth-first order as ast.walk, carrying the enclosing qualname along. Only statements
+    # (and the except handlers and match cases holding them) are queued: expressions hold no
+    # statements, and walking them would visit every element of every literal.
+    todo = deque([(tree, "")])
+    while todo:
+        node, scope = todo.popleft()
         if isinstance(node, ast.Assign):
             for target in node.targets:
                 if isinstance(target, ast.Name):
-                    type_hint = infer_type(node.value)
-                    annotations.append([file_path, target.id, type_hint])
+                    type_hint = infer_type(node.value, sample_size)
+                    records.append(AnnotationRecord(file_path, "AST", scope, node.lineno, "variable", target.id, type_hint))
         elif isinstance(node, ast.FunctionDef):
+            qualname = f"{scope}.{node.name}" if scope else node.name
             for arg in node.args.args:
                 if not arg.annotation:
-                    annotations.append([file_path, f"{node.name} (arg: {arg.arg})", "Missing Type Hint"])
+                    records.append(AnnotationRecord(file_path, "AST", qualname, arg.lineno, "argument", arg.arg, "Missing Type Hint"))
             if not node.returns:
-                annotations.append([file_path, f"{node.name} (return)", "Missing Return Type Hint"])
-    return annotations
+                records.append(AnnotationRecord(file_path, "AST", qualname, node.lineno, "return", node.name, "Missing Return Type Hint"))
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            scope = f"{scope}.{node.name}" if scope else node.name
+        todo.extend((child, scope) for child in ast.iter_child_nodes(node) if isinstance(child, STATEMENT_NODES))
+    return records
+
+def analyzer_key(sample_size=SAMPLE_SIZE):
+    """The result-cache key of the analysis; the sample size is part of it, as it changes the inferred types."""
+    return ANALYZER_VERSION if sample_size == SAMPLE_SIZE else f"{ANALYZER_VERSION}/sample={sample_size}"
+
+def iter_annotations(paths: Iterable[str], jobs: int = 1, cache: Optional[ResultCache] = None,
+                     sample_size: int = SAMPLE_SIZE, excludes: Iterable[str] = ()) -> Iterator[AnnotationRecord]:
+    """Lazily yields the AnnotationRecords of files, directories or globs, file by file as they are analyzed."""
+    analyze = partial(annotation_records, sample_size=sample_size)
+    for rows in analyze_files(iter_python_files(paths, excludes), analyzer_key(sample_size), analyze, jobs, cache):
+        yield from map(AnnotationRecord._make, rows)
+
+def analyze_code_for_types(file_path):
+    """Analyzes Python file for type hints and returns structured data."""
+    return [[record.file, record.label, record.type] for record in annotation_records(file_path)]
 
 def generate_report(file_path, annotations):
     """Generates a structured CSV report."""
-    report_file = file_path.replace('.py', '_AST_report.csv')
+    report_file = stage_path(file_path, AST_REPORT)
     try:
-        with open(report_file, 'w', newline='') as csvfile:
+        with metrics.span("write", report_file, stage="AST"), open(report_file, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
             writer.writerow(["File", "Variable/Function", "Type Hint"])
             writer.writerows(annotations)
@@ -55,14 +170,47 @@ def generate_report(file_path, annotations):
     except Exception as e:
         print(f"Error generating report: {e}")
 
+def open_report(path, buffer_size=REPORT_BUFFER_SIZE):
+    """Opens a text report through a large write buffer, gzip-compressed when the path ends in .gz."""
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(io.BufferedWriter(gzip.GzipFile(path, "wb"), buffer_size), encoding="utf-8", newline="")
+    return open(path, "w", newline="", encoding="utf-8", buffering=buffer_size)
+
+def generate_consolidated_report(report_file, results):
+    """Streams the rows of every (file_path, records) pair into one CSV report with a file index column."""
+    try:
+        with metrics.span("write", report_file, stage="AST"), open_report(report_file) as report:
+            writer = csv.writer(report)
+            writer.writerow(["File Index", "File", "Variable/Function", "Type Hint"])
+            for index, (_, records) in enumerate(results, start=1):
+                writer.writerows([index, record.file, record.label, record.type] for record in records)
+        print(f"Annotation report generated at {report_file}")
+    except Exception as e:
+        print(f"Error generating report: {e}")
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 AST_Annotator.py <file1.py> <file2.py> ...")
-        sys.exit(1)
-
-    for file_path in sys.argv[1:]:
-        if os.path.exists(file_path):
-            annotations = analyze_code_for_types(file_path)
-            generate_report(file_path, annotations)
-        else:
-            print(f"File not found: {file_path}")
+    parser = argparse.ArgumentParser(description="AST static annotation tool.")
+    add_discovery_arguments(parser)
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes (0: one per CPU).")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                        help=f"Elements typed from each end of a large literal (default: {SAMPLE_SIZE}, 0: all).")
+    parser.add_argument("--report", metavar="PATH",
+                        help="Write one consolidated report for all files instead of one per file "
+                             "(gzip-compressed if PATH ends in .gz).")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+
+    # Files are analyzed while the tree is still being searched; the copy pairs them with their results.
+    files, queued = itertools.tee(discover(args))
+    analyze = partial(annotation_records, sample_size=args.sample_size)
+    results = ((file_path, [AnnotationRecord(*row) for row in rows])
+               for file_path, rows in zip(files, analyze_files(queued, analyzer_key(args.sample_size), analyze, args.jobs, cache)))
+
+    if args.report:
+        generate_consolidated_report(args.report, results)
+    else:
+        for file_path, records in results:
+            generate_report(file_path, [[record.file, record.label, record.type] for record in records])
+            write_records(stage_path(file_path, AST_RECORDS), records)
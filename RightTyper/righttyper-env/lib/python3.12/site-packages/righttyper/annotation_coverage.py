@@ -7,6 +7,13 @@ import click
 
 from righttyper.righttyper_utils import TOOL_NAME
 
+try:
+    # Shared parse layer of the annotation pipeline: when it is importable the
+    # trees parsed here are reused by (and reuse those of) the other annotators.
+    from parse_cache import get_tree
+except ImportError:
+    get_tree = None
+
 # Suppress SyntaxWarning during AST parsing
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 
@@ -54,6 +61,18 @@ def generate_fully_qualified_names_dict(
     return collector.qualified_names
 
 
+def read_tree(file_path: str) -> ast.AST:
+    try:
+        if get_tree is not None:
+            return get_tree(file_path)
+        with open(file_path, "r") as file:
+            return ast.parse(file.read(), filename=file_path)
+    except SyntaxError:
+        return ast.parse("", filename=file_path)
+    except UnicodeDecodeError:
+        return ast.parse("", filename=file_path)
+
+
 def parse_python_file(
     file_path: str,
 ) -> list[int]:
@@ -62,14 +81,8 @@ def parse_python_file(
     not_annotated_count = 0
 
     import sys
-    
-    with open(file_path, "r") as file:
-        try:
-            tree = ast.parse(file.read(), filename=file_path)
-        except SyntaxError:
-            tree = ast.parse("", filename=file_path)
-        except UnicodeDecodeError:
-            tree = ast.parse("", filename=file_path)
+
+    tree = read_tree(file_path)
 
     # Dynamically adapt the recursion limit as needed
     old_recursion_limit = sys.getrecursionlimit()
@@ -113,7 +126,7 @@ def parse_python_file(
                 annotations_count += 1
 
             entry = (
-                file.name,
+                file_path,
                 qualified_names[node],
                 node.lineno,
             )
@@ -4,6 +4,7 @@ import importlib.metadata
 import importlib.util
 import inspect
 import itertools
+import json
 import logging
 import os
 import runpy
@@ -100,6 +101,9 @@ class Observations:
     # For each visited function, the values it yielded
     visited_funcs_yieldval: dict[FuncInfo, TypeInfoSet] = field(default_factory=lambda: defaultdict(TypeInfoSet))
 
+    # For each visited function, how many of its calls were observed (sampled)
+    visited_funcs_calls: dict[FuncInfo, int] = field(default_factory=lambda: defaultdict(int))
+
     namespace: dict[str, Any] = field(default_factory=dict)
 
     def _transform_types(self, tr: TypeInfo.Transformer) -> None:
@@ -227,6 +231,7 @@ def enter_function(code: CodeType, offset: int) -> Any:
         FunctionName(code.co_qualname),
     )
     obs.visited_funcs.add(t)
+    obs.visited_funcs_calls[t] += 1
 
     frame = inspect.currentframe()
     if frame and frame.f_back:
@@ -502,6 +507,93 @@ def execute_script_or_module(
             raise
 
 
+def run_with_monitoring(
+    script: str,
+    module: bool,
+    args: list[str],
+) -> None:
+    """Runs the script or module with type observation enabled, recording into 'obs'."""
+    setup_tool_id()
+    register_monitoring_callbacks(
+        enter_function,
+        call_handler,
+        exit_function,
+        yield_function,
+    )
+    sys.monitoring.restart_events()
+    setup_timer(restart_sampling)
+    # replace_dicts.replace_dicts()
+    try:
+        execute_script_or_module(script, module, args)
+    finally:
+        reset_monitoring()
+
+
+def collect_observations(
+    script: str,
+    args: abc.Sequence[str] = (),
+    module: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Runs a script (or module) under RightTyper inside the calling process and
+    returns its observations, as output_observations would write them, without
+    rendering or parsing any source. Options not set by the caller keep their defaults.
+    """
+    if not options.script_dir:
+        options.script_dir = os.path.dirname(os.path.realpath(script))
+    run_with_monitoring(script, module, list(args))
+    return observation_records()
+
+
+def observation_records() -> list[dict[str, Any]]:
+    """
+    Returns one JSON-serializable record per observed function: the type set seen
+    for each argument, the returned and yielded type sets, the resulting
+    annotation and the number of observed calls.
+    """
+    type_annotations = obs.collect_annotations()
+
+    def type_names(s: TypeInfoSet) -> list[str]:
+        return sorted(str(t) for t in s)
+
+    records = []
+    for t in sorted(type_annotations, key=lambda t: (t.file_name, t.func_name)):
+        if skip_this_file(
+            t.file_name,
+            options.script_dir,
+            options.include_all,
+            options.include_files_regex,
+        ):
+            continue
+
+        annotation = type_annotations[t]
+        records.append({
+            "file": t.file_name,
+            "function": t.func_name,
+            "calls": obs.visited_funcs_calls.get(t, 0),
+            "args": [
+                {
+                    "name": arginfo.arg_name,
+                    "types": type_names(arginfo.type_set),
+                    "annotation": arg_type,
+                }
+                for arginfo, (_, arg_type) in zip(obs.visited_funcs_arguments[t], annotation.args)
+            ],
+            # .get(): indexing the defaultdicts would record an empty observation.
+            "returns": type_names(obs.visited_funcs_retval.get(t, TypeInfoSet())),
+            "yields": type_names(obs.visited_funcs_yieldval.get(t, TypeInfoSet())),
+            "return_annotation": annotation.retval,
+        })
+
+    return records
+
+
+def output_observations(file: TextIO = sys.stdout) -> None:
+    """Writes observation_records() as JSON lines."""
+    for record in observation_records():
+        print(json.dumps(record), file=file)
+
+
 def output_signatures(
     sig_changes: list[SignatureChanges],
     file: TextIO = sys.stdout,
@@ -534,6 +626,9 @@ def post_process() -> None:
     with open(f"{TOOL_NAME}.out", "w+") as f:
         output_signatures(sig_changes, f)
 
+    with open(f"{TOOL_NAME}.jsonl", "w") as f:
+        output_observations(f)
+
 
 def process_file_wrapper(args) -> SignatureChanges|BaseException:
     try:
@@ -840,16 +935,5 @@ def main(
     options.use_multiprocessing = use_multiprocessing
     options.sampling = sampling 
 
-    setup_tool_id()
-    register_monitoring_callbacks(
-        enter_function,
-        call_handler,
-        exit_function,
-        yield_function,
-    )
-    sys.monitoring.restart_events()
-    setup_timer(restart_sampling)
-    # replace_dicts.replace_dicts()
-    execute_script_or_module(script, bool(module), args)
-    reset_monitoring()
+    run_with_monitoring(script, bool(module), args)
     post_process()
@@ -0,0 +1,21 @@
+import argparse
+from typing import List, Optional
+
+import pipeline
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="annotator-cli", description="Annotation Tool for AST, Conditional, and RightTyper Analysis")
+    subparsers = parser.add_subparsers(dest="command")
+    pipeline.add_arguments(subparsers.add_parser("pipeline", help="Run every annotator in one process and write the final report."))
+    subparsers.add_parser("tasks", help="Run the interactive task manager (default).")
+    args = parser.parse_args(argv)
+
+    if args.command == "pipeline":
+        pipeline.run_from_args(args)
+    else:
+        # Imported lazily: the task manager CLI needs tabulate, the pipeline does not.
+        import cli
+        cli.main()
+
+if __name__ == "__main__":
+    main()
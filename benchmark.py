@@ -0,0 +1,181 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+STAGES = ["ast", "var", "conditional", "generate_csv", "righttyper", "coverage"]
+
+# ------------------ Synthetic corpus ------------------
+def literal(size: int, depth: int, seed: int) -> str:
+    """Source of a list literal with `size` elements, each nested `depth` levels deep."""
+    def nested(value: int, level: int) -> str:
+        if level == 0:
+            return str(value)
+        if level % 2:
+            return f"[{nested(value, level - 1)}, {nested(value + 1, level - 1)}]"
+        return f"{{'k{value}': {nested(value, level - 1)}}}"
+    return "[" + ", ".join(nested(seed + i, depth) for i in range(size)) + "]"
+
+def module_source(index: int, functions: int, literal_size: int, depth: int) -> str:
+    """Source of one synthetic module: constants, lookup tables and plain functions."""
+    lines = [
+        f"# Synthetic module {index}",
+        "import os",
+        "",
+        f"NAME = 'module_{index}'",
+        f"LIMIT = {index}",
+        f"DATA = {literal(literal_size, depth, index)}",
+        "TABLE = {" + ", ".join(f"'key_{i}': {i}" for i in range(literal_size)) + "}",
+        "",
+    ]
+    for f in range(functions):
+        lines += [
+            f"def func_{f}(value, scale=2):",
+            f"    label = 'func_{f}'",
+            "    items = [value, value * scale]",
+            "    total = sum(items) + LIMIT",
+            "    return total",
+            "",
+        ]
+    return "\n".join(lines) + "\n"
+
+def generate_corpus(directory: str, files: int, functions: int, literal_size: int, depth: int) -> List[str]:
+    """Writes a synthetic repository and returns its module paths.
+
+    A main.py driver calling every function is added for the tracing stages.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    driver = []
+    for i in range(files):
+        path = os.path.join(directory, f"module_{i}.py")
+        with open(path, "w") as file:
+            file.write(module_source(i, functions, literal_size, depth))
+        paths.append(path)
+        driver.append(f"import module_{i}")
+        driver += [f"module_{i}.func_{f}({f})" for f in range(functions)]
+    with open(os.path.join(directory, "main.py"), "w") as file:
+        file.write("\n".join(driver) + "\n")
+    return paths
+
+# ------------------ Stages ------------------
+def run_stage(stage: str, corpus: str) -> int:
+    """Runs one pipeline stage over the corpus in this process; returns the number of files handled."""
+    files = sorted(glob.glob(os.path.join(corpus, "module_*.py")))
+
+    if stage == "ast":
+        import AST_Annotator
+        from records import AST_RECORDS, stage_path, write_records
+        for file_path in files:
+            records = AST_Annotator.annotation_records(file_path)
+            AST_Annotator.generate_report(file_path, [[r.file, r.label, r.type] for r in records])
+            write_records(stage_path(file_path, AST_RECORDS), records)
+    elif stage == "var":
+        import var_annotator
+        var_annotator.generate_report(files, os.path.join(corpus, "variable_annotation_report.csv"),
+                                      records_file=os.path.join(corpus, "variable_annotation_records.jsonl"))
+    elif stage == "conditional":
+        import conditional_annotator
+        from records import CONDITIONAL_RECORDS, stage_path, write_records
+        # Each file runs in its own worker process, as conditional_annotator.py runs them.
+        for file_path, annotations, _ in conditional_annotator.execute_isolated(files):
+            conditional_annotator.generate_runtime_annotation_report(file_path, annotations)
+            write_records(stage_path(file_path, CONDITIONAL_RECORDS),
+                          conditional_annotator.runtime_records(file_path, annotations))
+    elif stage == "generate_csv":
+        import itertools
+        import generate_csv
+        records = itertools.chain(
+            generate_csv.read_record_files(sorted(glob.glob(os.path.join(corpus, "*_AST_records.jsonl")))),
+            generate_csv.read_record_files(sorted(glob.glob(os.path.join(corpus, "*_conditional_records.jsonl")))),
+            generate_csv.read_records(os.path.join(corpus, "variable_annotation_records.jsonl")),
+        )
+        generate_csv.write_report(generate_csv.record_rows(records), os.path.join(corpus, "final_annotation_report.csv"))
+    elif stage == "righttyper":
+        from righttyper import righttyper
+        righttyper.options.script_dir = os.path.realpath(corpus)
+        righttyper.options.use_multiprocessing = False
+        righttyper.run_with_monitoring(os.path.join(corpus, "main.py"), False, [])
+        # The stage's wall time covers both tracing the driver above and this post-processing
+        # (the libcst rewrite of the traced files), as a righttyper run pays for both.
+        righttyper.process_all_files()
+    elif stage == "coverage":
+        from righttyper import annotation_coverage
+        annotation_coverage.analyze_all_directories(corpus)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+    return len(files)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size in MB of this process or of the largest of its finished workers."""
+    peak = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    # Linux reports KB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def measure_stage(stage: str, corpus: str) -> Dict[str, object]:
+    """Runs a stage in a fresh interpreter, so timings and peak RSS are not shared between stages."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-stage", stage, corpus],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        error = (result.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"stage": stage, "error": error}
+    return json.loads(lines[-1])
+
+def print_table(results: List[Dict[str, object]]) -> None:
+    print(f"{'Stage':<14}{'Files':>8}{'Wall (s)':>12}{'Files/s':>12}{'Peak RSS (MB)':>16}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['stage']:<14}  skipped: {result['error']}")
+            continue
+        print(f"{result['stage']:<14}{result['files']:>8}{result['wall_s']:>12.3f}"
+              f"{result['files_per_s']:>12.1f}{result['peak_rss_mb']:>16.1f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--run-stage":
+        # Child mode: run a single stage and report its measurements as JSON on the last line.
+        stage, corpus = sys.argv[2], sys.argv[3]
+        start = time.perf_counter()
+        count = run_stage(stage, corpus)
+        wall = time.perf_counter() - start
+        print(json.dumps({
+            "stage": stage,
+            "files": count,
+            "wall_s": wall,
+            "files_per_s": count / wall if wall > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark every annotation stage on a synthetic repository.")
+    parser.add_argument("--files", type=int, default=100, help="Number of modules (default: 100).")
+    parser.add_argument("--functions", type=int, default=10, help="Functions per module (default: 10).")
+    parser.add_argument("--literal-size", type=int, default=50, help="Elements per literal (default: 50).")
+    parser.add_argument("--depth", type=int, default=2, help="Nesting depth of literal elements (default: 2).")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run, in order.")
+    parser.add_argument("--keep", metavar="DIR", help="Generate the corpus in DIR and keep it.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON.")
+    args = parser.parse_args()
+
+    corpus = args.keep or tempfile.mkdtemp(prefix="annotator-bench-")
+    try:
+        generate_corpus(corpus, args.files, args.functions, args.literal_size, args.depth)
+        results = [measure_stage(stage, corpus) for stage in args.stages]
+    finally:
+        if not args.keep:
+            shutil.rmtree(corpus, ignore_errors=True)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
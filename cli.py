@@ -1,6 +1,6 @@
 # cli.py
 
-from task_manager import add_task, list_tasks, flush_task, flush_all_tasks, delete_all_tasks
+from task_manager import add_task, list_tasks, flush_task, flush_all_tasks, delete_all_tasks, export_tasks
 from tabulate import tabulate  # <-- Add this import statement to fix the error
 
 def main() -> None:
@@ -10,6 +10,7 @@ def main() -> None:
         print("2. List Tasks")
         print("3. Flush Task")
         print("4. Exit")
+        print("5. Export Tasks to tasks.json")
         
         choice = input("\nChoose an option: ")
 
@@ -46,6 +47,8 @@ def main() -> None:
         elif choice == "4":
             print("\nExiting Task Manager. Goodbye!")
             break
+        elif choice == "5":
+            print(export_tasks())
         else:
             print("\nInvalid option, please try again.")
 
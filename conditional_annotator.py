@@ -1,74 +1,536 @@
+import argparse
+import ast
+import importlib
+import inspect
+import itertools
+import multiprocessing
 import os
+import random
 import sys
-from typing import Any, Dict
+import time
+import tracemalloc
+from multiprocessing.connection import wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-def read_python_file(file_path: str) -> str:
-    """Reads a Python file."""
+import metrics
+from discovery import add_discovery_arguments, discover, iter_python_files
+from parallel import resolve_jobs
+from parse_cache import get_tree
+from records import CONDITIONAL_RECORDS, CONDITIONAL_REPORT, IMPORT_REPORT, AnnotationRecord, stage_path, write_records
+
+# Per-file limits of the isolated workers; 0 disables a limit. The memory limit is growth over
+# the address space a worker starts with, which a fork inherits from this process.
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MEMORY_MB = 2048
+
+# Lists and dicts longer than this are typed from a random sample of their elements.
+SAMPLE_SIZE = 64
+SAMPLE_SEED = 0
+# Containers nested deeper than this are typed Any.
+MAX_TYPE_DEPTH = 32
+
+def sample_elements(container: Any, sample_size: int, rng: random.Random) -> Iterable[Any]:
+    """Returns the elements of a list or the items of a dict, or a sample of sample_size of them.
+
+    Lists are sampled at random positions. Dicts cannot be indexed, so their sample
+    is the first and last items, read without walking the ones in between.
+    """
+    size = len(container)
+    if not sample_size or size <= sample_size:
+        return container.items() if isinstance(container, dict) else container
+    if isinstance(container, list):
+        return [container[i] for i in sorted(rng.sample(range(size), sample_size))]
+    head = sample_size - sample_size // 2
+    return [*itertools.islice(container.items(), head),
+            *reversed(list(itertools.islice(reversed(container.items()), sample_size - head)))]
+
+def infer_runtime_types(var: Any, memo: Optional[Dict[int, str]] = None, sample_size: int = SAMPLE_SIZE) -> str:
+    """Infers runtime types dynamically.
+
+    Containers with more than sample_size elements are typed from a (seeded) sample.
+    Lists and dicts are memoized by id(), so pass the same memo to type objects
+    sharing sub-objects. A container reached through itself, or nested deeper
+    than MAX_TYPE_DEPTH, is Any.
+    """
+    return _infer_runtime_types(var, {} if memo is None else memo, sample_size, random.Random(SAMPLE_SEED))
+
+def scalar_type(var: Any) -> str:
+    """The type of anything but a list or dict."""
+    var_type = type(var)
+    if var_type is int:
+        return "int"
+    elif var_type is float:
+        return "float"
+    elif var_type is str:
+        return "str"
+    elif var_type is bool:
+        return "bool"
+    elif callable(var):
+        return "function"
+    return "Any"
+
+def _infer_runtime_types(var: Any, memo: Dict[int, str], sample_size: int, rng: random.Random) -> str:
+    # Containers are typed once their elements are, through an explicit stack, so nesting depth is not bound
+    # by the recursion limit. A container result that a cycle or the depth limit cut short (an element
+    # typed Any because it was still being typed, or too deep) is not memoized, as typing that container
+    # on its own would go further; it is only reused within this call, which keeps cyclic structures
+    # from being walked once per path.
+    results: List[str] = []  # Types of the values typed so far whose container is still open
+    active: Set[int] = set()
+    cut: Dict[int, str] = {}
+    truncated = 0
+    todo: List[tuple] = [("type", var, 0)]
+    while todo:
+        item = todo.pop()
+        if item[0] == "type":
+            _, value, depth = item
+            try:
+                if type(value) is not list and type(value) is not dict:
+                    results.append(scalar_type(value))
+                    continue
+                key = id(value)
+                if key in memo or key in cut:
+                    results.append(memo[key] if key in memo else cut[key])
+                    continue
+                if key in active or depth > MAX_TYPE_DEPTH:
+                    truncated += 1
+                    results.append("Any")
+                    continue
+                elements = list(sample_elements(value, sample_size, rng))
+            except Exception as e:
+                results.append(f"Invalid Type ({str(e)})")
+                continue
+            active.add(key)
+            todo.append(("combine", value, len(elements), truncated))
+            if type(value) is dict:
+                elements = [part for pair in elements for part in pair]
+            todo.extend(("type", element, depth + 1) for element in reversed(elements))
+        else:
+            _, value, count, truncated_before = item
+            if type(value) is list:
+                element_types = dict.fromkeys(results[len(results) - count:])
+                del results[len(results) - count:]
+                result = f"List[{', '.join(element_types)}]" if element_types else "List[Any]"
+            else:
+                pairs = results[len(results) - 2 * count:]
+                del results[len(results) - 2 * count:]
+                key_types, value_types = dict.fromkeys(pairs[0::2]), dict.fromkeys(pairs[1::2])
+                result = f"Dict[{', '.join(key_types)}, {', '.join(value_types)}]" if key_types and value_types else "Dict[Any, Any]"
+            active.discard(id(value))
+            (memo if truncated == truncated_before else cut)[id(value)] = result
+            results.append(result)
+    return results[0]
+
+class LocalTypeSampler:
+    """Types the locals of one file's functions as they return, up to `budget` samples per function.
+
+    Uses sys.monitoring PY_RETURN events where available (Python 3.12+), disabling a
+    return site once its function's budget is spent, and sys.setprofile before that.
+    """
+
+    def __init__(self, file_path: str, budget: int):
+        self.file_path = file_path
+        self.budget = budget
+        self.samples: Dict[Any, int] = {}  # Code object -> samples taken
+        self.types: Dict[str, Dict[str, None]] = {}  # "qualname.name" -> ordered set of types
+
+    def sample(self, code, frame) -> bool:
+        """Records a returning frame's locals; False once no more samples are wanted from this code."""
+        # Skips other files, the module and class bodies (not CO_OPTIMIZED) and comprehensions.
+        if code.co_filename != self.file_path or not code.co_flags & inspect.CO_OPTIMIZED or code.co_name.startswith("<"):
+            return False
+        taken = self.samples.get(code, 0)
+        if taken >= self.budget:
+            return False
+        self.samples[code] = taken + 1
+        qualname = getattr(code, "co_qualname", code.co_name).replace(".<locals>", "")
+        memo = {}
+        for name, value in frame.f_locals.items():
+            self.types.setdefault(f"{qualname}.{name}", {})[infer_runtime_types(value, memo)] = None
+        return True
+
+    def annotations(self) -> Dict[str, str]:
+        return {var: next(iter(types)) if len(types) == 1 else f"Union[{', '.join(types)}]"
+                for var, types in self.types.items()}
+
+    def _on_return(self, code, instruction_offset, retval):
+        # The monitored function's frame is the caller of this callback.
+        if not self.sample(code, sys._getframe(1)):
+            return sys.monitoring.DISABLE
+
+    def _on_profile(self, frame, event, arg):
+        if event == "return":
+            self.sample(frame.f_code, frame)
+
+    def __enter__(self):
+        self.monitoring = hasattr(sys, "monitoring")
+        if self.monitoring:
+            tool = sys.monitoring.PROFILER_ID
+            try:
+                sys.monitoring.use_tool_id(tool, "conditional_annotator")
+            except ValueError:
+                # Another profiler (e.g. RightTyper) holds the tool id; fall back to sys.setprofile.
+                self.monitoring = False
+        if self.monitoring:
+            sys.monitoring.register_callback(tool, sys.monitoring.events.PY_RETURN, self._on_return)
+            sys.monitoring.set_events(tool, sys.monitoring.events.PY_RETURN)
+        else:
+            sys.setprofile(self._on_profile)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.monitoring:
+            tool = sys.monitoring.PROFILER_ID
+            sys.monitoring.set_events(tool, sys.monitoring.events.NO_EVENTS)
+            sys.monitoring.register_callback(tool, sys.monitoring.events.PY_RETURN, None)
+            sys.monitoring.free_tool_id(tool)
+            sys.monitoring.restart_events()
+        else:
+            sys.setprofile(None)
+
+def execute_and_analyze(file_path: str, local_samples: int = 0) -> Dict[str, str]:
+    """Executes a script and analyzes variable types.
+
+    With local_samples, the locals of the file's functions are also typed, as
+    'function.name' entries, from up to that many returns of each function.
+    """
+    global_vars = {}
+    sampler = LocalTypeSampler(file_path, local_samples)
+    with metrics.span("analyze", file_path, stage="Conditional"):
+        try:
+            # Compile the shared tree instead of re-parsing the source text.
+            code = compile(get_tree(file_path), file_path, "exec")
+            with metrics.span("exec"):
+                if local_samples:
+                    with sampler:
+                        exec(code, global_vars)
+                else:
+                    exec(code, global_vars)
+        except Exception as e:
+            print(f"Error executing file: {e}")
+            return {}
+
+        with metrics.span("infer"):
+            # One memo for the module, so objects shared between globals are typed once.
+            memo = {}
+            annotations = {var: infer_runtime_types(value, memo) for var, value in global_vars.items() if not var.startswith("__")}
+            annotations.update(sampler.annotations())
+            return annotations
+
+def execute_and_measure(file_path: str, local_samples: int = 0) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Runs execute_and_analyze while timing every import it triggers; returns its types and the costs.
+
+    Imports are timed around importlib's _find_and_load, where `-X importtime`
+    measures them, so only modules not imported yet are listed, in completion
+    order with their nesting depth. Memory is allocation growth seen by tracemalloc.
+    This patches the import system, so it is meant for a throwaway worker process.
+    """
+    import importlib._bootstrap as bootstrap
+
+    imports = []  # (depth, module, self seconds, cumulative seconds, memory growth in bytes)
+    nested = []  # Time spent in nested imports, per open import
+    find_and_load = bootstrap._find_and_load
+
+    def timed_find_and_load(name, *args):
+        depth = len(nested)
+        nested.append(0.0)
+        memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            return find_and_load(name, *args)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = nested.pop()
+            if nested:
+                nested[-1] += cumulative
+            imports.append((depth, name, cumulative - children, cumulative, tracemalloc.get_traced_memory()[0] - memory))
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    memory = tracemalloc.get_traced_memory()[0]
+    bootstrap._find_and_load = timed_find_and_load
+    start = time.perf_counter()
     try:
-        with open(file_path, "r") as file:
-            return file.read()
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return None
+        annotations = execute_and_analyze(file_path, local_samples)
+    finally:
+        bootstrap._find_and_load = find_and_load
+    wall = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    costs = {
+        "wall_s": wall,
+        "import_s": sum(entry[3] for entry in imports if entry[0] == 0),
+        "memory_bytes": current - memory,
+        "peak_bytes": peak - memory,
+        "imports": imports,
+    }
+    return annotations, costs
 
-def infer_runtime_types(var: Any) -> str:
-    """Infers runtime types dynamically."""
+def limit_memory(memory_mb: int) -> None:
+    """Caps this process's address space at its current size plus memory_mb (absolute without /proc)."""
+    import resource
+    limit = memory_mb * 1024 * 1024
     try:
-        var_type = type(var)
-        if var_type is int:
-            return "int"
-        elif var_type is float:
-            return "float"
-        elif var_type is str:
-            return "str"
-        elif var_type is bool:
-            return "bool"
-        elif var_type is list:
-            element_types = {infer_runtime_types(e) for e in var}
-            return f"List[{', '.join(element_types)}]" if element_types else "List[Any]"
-        elif var_type is dict:
-            key_types = {infer_runtime_types(k) for k in var.keys()}
-            value_types = {infer_runtime_types(v) for v in var.values()}
-            return f"Dict[{', '.join(key_types)}, {', '.join(value_types)}]" if key_types and value_types else "Dict[Any, Any]"
-        elif callable(var):
-            return "function"
-        return "Any"
-    except Exception as e:
-        return f"Invalid Type ({str(e)})"
+        with open("/proc/self/statm") as statm:
+            limit += int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
 
-def execute_and_analyze(file_path: str) -> Dict[str, str]:
-    """Executes a script and analyzes variable types."""
-    global_vars = {}
+def _execute_in_worker(file_path: str, memory_mb: int, measure: bool, local_samples: int, profile: bool, conn) -> None:
+    """Worker process body: executes one file under the memory limit and sends back its type table, costs and spans only."""
+    if memory_mb:
+        limit_memory(memory_mb)
+    if profile:
+        metrics.enable()
+        # A forked worker inherits the spans this process finished so far; only its own go back.
+        metrics.take_spans()
+    if measure:
+        annotations, costs = execute_and_measure(file_path, local_samples)
+    else:
+        annotations, costs = execute_and_analyze(file_path, local_samples), None
+    conn.send((annotations, costs, metrics.take_spans() if profile else []))
+    conn.close()
+
+def preload_modules(names: Iterable[str]) -> List[str]:
+    """Imports modules into this process, so forked workers start with them; returns the ones that loaded."""
+    loaded = []
+    with metrics.span("preload", stage="Conditional"):
+        for name in names:
+            try:
+                importlib.import_module(name)
+                loaded.append(name)
+            except Exception as e:
+                print(f"Error preloading module {name}: {e}")
+    return loaded
+
+def execute_isolated(files: Iterable[str], jobs: int = 1, timeout: float = DEFAULT_TIMEOUT,
+                     memory_mb: int = DEFAULT_MEMORY_MB, preload: Iterable[str] = (),
+                     measure: bool = False, local_samples: int = 0) -> Iterator[Tuple[str, Dict[str, str], Optional[Dict[str, Any]]]]:
+    """Yields (file, execute_and_analyze result, costs) in input order, executing every file in its own process.
+
+    Up to `jobs` files run at once. A worker is used for a single file, so globals
+    and imports never leak between targets; stdin is closed, so input() fails fast.
+    A file that exceeds `timeout` seconds is killed and, like one that crashes or
+    runs out of memory, yields an empty table.
+
+    With `preload`, this process acts as a zygote: the modules are imported once
+    here and every worker is forked from it, sharing them copy-on-write instead
+    of importing them again (fork is only available on POSIX, and meant for Linux).
+
+    With `measure`, costs holds the execute_and_measure timings of the file; else None.
+    `local_samples` is passed on to execute_and_analyze. When metrics are enabled,
+    the spans recorded in each worker are added to this process's.
+    """
+    jobs = resolve_jobs(jobs)
+    preload = list(preload)
+    if preload and not hasattr(os, "fork"):
+        print("Preloading modules needs fork(); executing targets without it.")
+        preload = []
+    context = multiprocessing.get_context("fork" if preload else None)
+    preload_modules(preload)
+    files = iter(files)
+    running = {}  # Result pipe -> (input index, file, process, deadline)
+    done: Dict[int, Tuple[str, Dict[str, str]]] = {}
+    submitted = yielded = 0
+
+    while True:
+        # Bounded like parallel.analyze_files, so a slow head file cannot pile up results.
+        while len(running) < jobs and submitted - yielded < jobs * 4:
+            file_path = next(files, None)
+            if file_path is None:
+                break
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_execute_in_worker,
+                                      args=(file_path, memory_mb, measure, local_samples, metrics.is_enabled(), sender),
+                                      daemon=True)
+            process.start()
+            sender.close()
+            deadline = time.monotonic() + timeout if timeout else None
+            running[receiver] = (submitted, file_path, process, deadline)
+            submitted += 1
+        if not running:
+            break
+
+        deadlines = [entry[3] for entry in running.values() if entry[3] is not None]
+        wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+        for receiver in wait(list(running), wait_for):
+            index, file_path, process, _ = running.pop(receiver)
+            try:
+                annotations, costs, spans = receiver.recv()
+                metrics.add_spans(spans)
+            except EOFError:
+                annotations = costs = None
+            receiver.close()
+            process.join()
+            if annotations is None:
+                print(f"Error executing file: worker for {file_path} exited with code {process.exitcode}")
+                annotations = {}
+            done[index] = (file_path, annotations, costs)
+
+        now = time.monotonic()
+        for receiver, (index, file_path, process, deadline) in list(running.items()):
+            if deadline is not None and now >= deadline:
+                process.kill()
+                process.join()
+                receiver.close()
+                del running[receiver]
+                print(f"Error executing file: {file_path} timed out after {timeout:g}s")
+                done[index] = (file_path, {}, None)
+
+        while yielded in done:
+            yield done.pop(yielded)
+            yielded += 1
+
+def binding_lines(file_path: str) -> Dict[str, int]:
+    """Maps each module-level name to the line of its last binding in the source."""
+    lines = {}
     try:
-        exec(read_python_file(file_path), global_vars)
-    except Exception as e:
-        print(f"Error executing file: {e}")
-        return {}
+        # Stack of statements still to visit, next one last.
+        statements = list(reversed(get_tree(file_path).body))
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return lines
+    while statements:
+        node = statements.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            lines[node.name] = node.lineno
+            continue
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                lines[alias.asname or alias.name.split(".")[0]] = node.lineno
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name):
+                        lines[name.id] = node.lineno
+        # Module-level code nested in if/try/with/for blocks still binds globals.
+        for field in ("finalbody", "orelse", "handlers", "body"):
+            statements.extend(reversed(getattr(node, field, [])))
+    return lines
+
+def function_lines(file_path: str) -> Dict[str, int]:
+    """Maps the qualname of every function in the source (classes and nesting included) to its def line."""
+    lines = {}
+    try:
+        todo = [(get_tree(file_path), "")]
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return lines
+    while todo:
+        node, scope = todo.pop()
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{scope}.{child.name}" if scope else child.name
+                if not isinstance(child, ast.ClassDef):
+                    lines[qualname] = child.lineno
+                todo.append((child, qualname))
+            else:
+                todo.append((child, scope))
+    return lines
+
+def runtime_records(file_path: str, annotations: Dict[str, str]) -> List[AnnotationRecord]:
+    """Turns execute_and_analyze results into records located at each name's binding.
+
+    Sampled locals ('function.name') are located at their function's def line.
+    """
+    lines = binding_lines(file_path)
+    functions = function_lines(file_path) if any("." in var for var in annotations) else {}
+    records = []
+    for var, annotation in annotations.items():
+        qualname, _, name = var.rpartition(".")
+        lineno = functions.get(qualname, 0) if qualname else lines.get(var, 0)
+        records.append(AnnotationRecord(file_path, "Conditional", qualname, lineno, "variable", name, annotation))
+    return records
 
-    return {var: infer_runtime_types(value) for var, value in global_vars.items() if not var.startswith("__")}
+def iter_runtime_annotations(paths: Iterable[str], excludes: Iterable[str] = (), jobs: int = 1,
+                             timeout: float = DEFAULT_TIMEOUT, memory_mb: int = DEFAULT_MEMORY_MB,
+                             preload: Iterable[str] = (), local_samples: int = 0) -> Iterator[AnnotationRecord]:
+    """Lazily yields the runtime records of files, directories or globs, executed in isolated workers."""
+    files = iter_python_files(paths, excludes)
+    results = execute_isolated(files, jobs, timeout, memory_mb, preload, local_samples=local_samples)
+    for file_path, annotations, _ in results:
+        yield from runtime_records(file_path, annotations)
 
 def generate_runtime_annotation_report(file_path: str, annotations: Dict[str, str]) -> None:
     """Saves analysis results as a report."""
-    report_path = file_path.replace(".py", "_conditional_runtime_annotation_report.txt")
+    report_path = stage_path(file_path, CONDITIONAL_REPORT)
     try:
-        with open(report_path, "w") as report:
+        with metrics.span("write", report_path, stage="Conditional"), open(report_path, "w") as report:
             for var, annotation in annotations.items():
                 report.write(f"Variable '{var}' is inferred as type: {annotation}\n")
         print(f"Runtime annotation report generated: {report_path}")
     except Exception as e:
         print(f"Error generating report: {e}")
 
+def generate_import_cost_report(file_path: str, costs: Dict[str, Any]) -> None:
+    """Saves execute_and_measure costs next to the type report, with imports laid out like -X importtime."""
+    report_path = stage_path(file_path, IMPORT_REPORT)
+    try:
+        with metrics.span("write", report_path, stage="Conditional"), open(report_path, "w") as report:
+            report.write(f"Executed {file_path} in {costs['wall_s'] * 1000:.1f} ms "
+                         f"({costs['import_s'] * 1000:.1f} ms importing), "
+                         f"memory +{costs['memory_bytes'] / 1024:.1f} KiB (peak +{costs['peak_bytes'] / 1024:.1f} KiB)\n")
+            report.write("import time: self [us] | cumulative | memory [KiB] | imported package\n")
+            for depth, module, self_s, cumulative_s, memory in costs["imports"]:
+                report.write(f"import time: {self_s * 1e6:>9.0f} | {cumulative_s * 1e6:>10.0f} | "
+                             f"{memory / 1024:>12.1f} | {'  ' * depth}{module}\n")
+        print(f"Import cost report generated: {report_path}")
+    except Exception as e:
+        print(f"Error generating report: {e}")
+
+def add_isolation_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the worker pool and per-file limit options to an argparse parser."""
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of files executed at once (0: one per CPU).")
+    add_limit_arguments(parser)
+    add_preload_argument(parser)
+
+def add_limit_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the per-file --timeout and --memory-mb options to an argparse parser."""
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Wall-clock limit per file in seconds (default: {DEFAULT_TIMEOUT:g}, 0: none).")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help=f"Address-space growth allowed per file in MB, over what its worker starts with "
+                             f"(default: {DEFAULT_MEMORY_MB}, 0: none).")
+
+def add_preload_argument(parser: argparse.ArgumentParser) -> None:
+    """Adds the zygote --preload option (comma-separated, repeatable) to an argparse parser."""
+    parser.add_argument("--preload", action="append", default=[], metavar="MODULES",
+                        help="Import these comma-separated modules once and fork every target's worker "
+                             "from this process, instead of importing them per file (Linux).")
+
+def add_local_samples_argument(parser: argparse.ArgumentParser) -> None:
+    """Adds the --local-samples option to an argparse parser."""
+    parser.add_argument("--local-samples", type=int, default=0, metavar="N",
+                        help="Also type the locals of each function from up to N of its returns (default: 0, off). "
+                             "Uses sys.monitoring on Python 3.12+; older interpreters fall back to sys.setprofile, "
+                             "which slows every call of the executed code down.")
+
+def preload_names(values: List[str]) -> List[str]:
+    """Flattens --preload values into module names."""
+    return [name.strip() for value in values for name in value.split(",") if name.strip()]
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 conditional_annotator.py <file1.py> <file2.py> ...")
-        sys.exit(1)
-
-    for file_path in sys.argv[1:]:
-        if os.path.exists(file_path):
-            annotations = execute_and_analyze(file_path)
-            if annotations:
-                generate_runtime_annotation_report(file_path, annotations)
-            else:
-                print(f"No variables detected for annotation in {file_path}.")
+    parser = argparse.ArgumentParser(description="Runtime (conditional) annotation tool.")
+    add_discovery_arguments(parser)
+    add_isolation_arguments(parser)
+    parser.add_argument("--import-costs", action="store_true",
+                        help="Also report each target's exec time, nested import times and memory growth "
+                             "to <file>_conditional_import_report.txt.")
+    add_local_samples_argument(parser)
+    args = parser.parse_args()
+
+    results = execute_isolated(discover(args), args.jobs, args.timeout, args.memory_mb,
+                               preload_names(args.preload), args.import_costs, args.local_samples)
+    for file_path, annotations, costs in results:
+        if costs is not None:
+            generate_import_cost_report(file_path, costs)
+        # Written even when empty, so a splice never picks up the records of an earlier run.
+        write_records(stage_path(file_path, CONDITIONAL_RECORDS), runtime_records(file_path, annotations))
+        if annotations:
+            generate_runtime_annotation_report(file_path, annotations)
         else:
-            print(f"File not found: {file_path}")
+            print(f"No variables detected for annotation in {file_path}.")
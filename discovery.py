@@ -0,0 +1,166 @@
+import argparse
+import glob
+import os
+import re
+from typing import Iterable, Iterator, List, Pattern, Tuple
+
+# Skipped in every directory walk, on top of the user's --exclude patterns.
+DEFAULT_EXCLUDES = [".git/", "__pycache__/", ".annotator_cache/"]
+
+def bracket_end(pattern: str, start: int) -> int:
+    """The index of the ']' closing the class opened at `start`, -1 if unclosed; a ']' first in the class is literal."""
+    i = start + 1
+    if pattern[i:i + 1] in ("!", "^"):
+        i += 1
+    if pattern[i:i + 1] == "]":
+        i += 1
+    return pattern.find("]", i)
+
+def translate(pattern: str) -> Pattern:
+    """Compiles one .gitignore pattern (without '!' or a trailing '/') to a regex over '/'-separated paths."""
+    # A pattern without an inner slash matches at any depth; one with a slash is anchored at the root.
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and bracket_end(pattern, i) != -1:
+            end = bracket_end(pattern, i)
+            body = pattern[i + 1:end]
+            # Only a leading '!' (or '^') negates; a negated class still never matches '/'.
+            negated = body[:1] in ("!", "^")
+            body = re.sub(r"([\\\[\]^&~|])", r"\\\1", body[1:] if negated else body)
+            regex += ("[^/" if negated else "[") + body + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex if anchored else "(?:.*/)?" + regex)
+
+class ExcludeRules:
+    """A list of .gitignore-style patterns; the last matching pattern decides, '!' re-includes."""
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.rules: List[Tuple[Pattern, bool, bool]] = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            pattern = pattern[1:] if negated else pattern
+            directory_only = pattern.endswith("/")
+            self.rules.append((translate(pattern.rstrip("/")), directory_only, negated))
+
+    def excluded(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Whether a path, relative to the current directory and '/'-separated, is excluded."""
+        result = False
+        for regex, directory_only, negated in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if regex.fullmatch(rel_path):
+                result = not negated
+        return result
+
+    def excluded_path(self, rel_path: str) -> bool:
+        """Whether a file is excluded, itself or through one of its parent directories."""
+        parts = rel_path.split("/")
+        return any(self.excluded("/".join(parts[:i]), is_dir=True) for i in range(1, len(parts))) \
+            or self.excluded(rel_path)
+
+def read_patterns(path: str) -> List[str]:
+    """Reads the patterns of an exclude file such as .gitignore."""
+    with open(path, encoding="utf-8") as file:
+        return file.read().splitlines()
+
+def walk_python_files(root: str, rules: ExcludeRules) -> Iterator[str]:
+    """Lazily yields the .py files under a directory, pruning excluded directories, in sorted order.
+
+    Paths are matched against the rules relative to the current directory, like glob matches.
+    """
+    base = os.path.relpath(root).replace(os.sep, "/")
+    prefix = "" if base == "." else base + "/"
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Error reading directory: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not rules.excluded(prefix + rel_path, is_dir=True):
+                    subdirs.append(rel_path)
+            elif entry.name.endswith(".py") and not rules.excluded(prefix + rel_path):
+                yield os.path.join(root, rel_path)
+        # Reversed so subdirectories are visited in name order.
+        stack.extend(reversed(subdirs))
+
+def iter_python_files(inputs: Iterable[str], excludes: Iterable[str] = ()) -> Iterator[str]:
+    """Lazily expands files, directories and glob patterns to the Python files to annotate.
+
+    Files named explicitly are always kept; files found by walking a directory or
+    matching a glob are filtered through DEFAULT_EXCLUDES and `excludes`, both
+    matched relative to the current directory (as a root .gitignore is). Each
+    file is yielded once, as soon as it is found.
+    """
+    rules = ExcludeRules([*DEFAULT_EXCLUDES, *excludes])
+    seen = set()
+
+    def unseen(paths: Iterable[str]) -> Iterator[str]:
+        for path in paths:
+            key = os.path.realpath(path)
+            if key not in seen:
+                seen.add(key)
+                yield path
+
+    for item in inputs:
+        if os.path.isdir(item):
+            yield from unseen(walk_python_files(item, rules))
+        elif os.path.isfile(item):
+            yield from unseen([item])
+        elif glob.has_magic(item):
+            # Matches come in directory order; sort them so runs list files the same way everywhere.
+            for match in sorted(glob.glob(item, recursive=True)):
+                if os.path.isdir(match):
+                    yield from unseen(walk_python_files(match, rules))
+                elif match.endswith(".py") and not rules.excluded_path(os.path.relpath(match).replace(os.sep, "/")):
+                    yield from unseen([match])
+        else:
+            print(f"File not found: {item}")
+
+def add_discovery_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the file, directory and glob inputs and the exclude options to an argparse parser."""
+    parser.add_argument("files", nargs="+", metavar="path",
+                        help="Python files, directories to search recursively, or glob patterns (quote them).")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="Skip paths matching a .gitignore-style pattern (repeatable).")
+    parser.add_argument("--exclude-from", action="append", default=[], metavar="FILE",
+                        help="Read exclude patterns from FILE, e.g. .gitignore (repeatable).")
+
+def exclude_patterns(args: argparse.Namespace) -> List[str]:
+    """The exclude patterns of add_discovery_arguments options: --exclude-from files first, then --exclude."""
+    excludes: List[str] = []
+    for path in args.exclude_from:
+        excludes.extend(read_patterns(path))
+    excludes.extend(args.exclude)
+    return excludes
+
+def discover(args: argparse.Namespace) -> Iterator[str]:
+    """Returns the lazy file iterator selected by add_discovery_arguments options."""
+    return iter_python_files(args.files, exclude_patterns(args))
@@ -1,6 +1,13 @@
+import argparse
 import csv
+import itertools
+import json
+import os
+import sys
 from pathlib import Path
-import pandas as pd
+
+import metrics
+from records import AST_RECORDS, CONDITIONAL_RECORDS, read_records, stage_path
 
 # Input file paths
 ast_files = [
@@ -14,44 +21,62 @@ conditional_files = [
 ]
 
 variable_file = "variable_annotation_report.txt"
+
+# Structured records written next to the reports above
+ast_record_files = [
+    "cli_AST_records.jsonl",
+    "task_manager_AST_records.jsonl"
+]
+
+conditional_record_files = [
+    "cli_conditional_records.jsonl",
+    "task_manager_conditional_records.jsonl"
+]
+
+variable_record_file = "variable_annotation_records.jsonl"
 righttyper_path = "/home/training/Final_Annotator/RightTyper/righttyper.out"
+# Observations RightTyper writes next to righttyper.out
+righttyper_json_path = str(Path(righttyper_path).with_suffix(".jsonl"))
 output_csv = "final_annotation_report.csv"
 
-# Prepare data container and serial number
-final_data = []
-sl_no = 1
+COLUMNS = [
+    "SL_No", "Module", "Function", "Function_Return_Type",
+    "Function_Arguments", "Function_Argument_Type", "Annotator_Type",
+    "Variable_Name", "Variable_Type"
+]
 
 # Helper to extract clean module name
 def get_module_name(file, suffix):
     return Path(file).name.replace(suffix, ".py")
 
 # ------------------ AST ------------------
-for file in ast_files:
-    module = get_module_name(file, "_AST_report.txt")
-    with open(file) as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                final_data.append([
-                    sl_no, module, line, "Unknown", "", "", "AST", "", ""
-                ])
-                sl_no += 1
+def ast_rows(files):
+    """Yields final-report rows (without SL_No) from AST text reports."""
+    for file in files:
+        module = get_module_name(file, "_AST_report.txt")
+        with open(file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield [module, line, "Unknown", "", "", "AST", "", ""]
 
 # ------------------ Conditional ------------------
-for file in conditional_files:
-    module = get_module_name(file, "_conditional_runtime_annotation_report.txt")
-    with open(file) as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                final_data.append([
-                    sl_no, module, line, "Unknown", "", "", "Conditional", "", ""
-                ])
-                sl_no += 1
+def conditional_rows(files):
+    """Yields final-report rows (without SL_No) from conditional runtime reports."""
+    for file in files:
+        module = get_module_name(file, "_conditional_runtime_annotation_report.txt")
+        with open(file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield [module, line, "Unknown", "", "", "Conditional", "", ""]
 
 # ------------------ Variable Annotator ------------------
-if Path(variable_file).exists():
-    with open(variable_file) as f:
+def variable_rows(path):
+    """Yields final-report rows (without SL_No) from the variable annotator report."""
+    if not Path(path).exists():
+        return
+    with open(path) as f:
         current_func = ""
         module = ""
         for line in f:
@@ -64,44 +89,201 @@ if Path(variable_file).exists():
                 current_func = line.split("Function:")[1].strip()
             elif ":" in line:
                 var_name, var_type = map(str.strip, line.split(":", 1))
-                final_data.append([
-                    sl_no, module, current_func, "", "", "", "var_annotator", var_name, var_type
-                ])
-                sl_no += 1
+                yield [module, current_func, "", "", "", "var_annotator", var_name, var_type]
 
 # ------------------ RightTyper ------------------
-if Path(righttyper_path).exists():
-    with open(righttyper_path) as f:
-        lines = f.readlines()
-
-    current_module = ""
-    for line in lines:
-        line = line.strip()
-        if line.endswith(".py:"):
-            current_module = Path(line[:-1]).name
-        elif line.startswith("+ def "):
-            func_sig = line[6:]
-            if "->" in func_sig:
-                func_part, return_type = func_sig.split("->")
-                func_name = func_part.split("(")[0].strip()
-                args_str = func_part.split("(", 1)[1].rstrip(")")
-                args = [arg.strip() for arg in args_str.split(",") if arg.strip()]
-                return_type = return_type.strip()
-
-                for arg in args:
-                    if ":" in arg:
-                        arg_name, arg_type = map(str.strip, arg.split(":", 1))
-                        final_data.append([
-                            sl_no, current_module, func_name, return_type,
-                            arg_name, arg_type, "RightTyper", "", ""
-                        ])
-                        sl_no += 1
+def signature_rows(module, func_sig):
+    """Yields one final-report row (without SL_No) per annotated argument of a 'name(args) -> ret' signature."""
+    if "->" in func_sig:
+        func_part, return_type = func_sig.split("->")
+        func_name = func_part.split("(")[0].strip()
+        args_str = func_part.split("(", 1)[1].rstrip(")")
+        args = [arg.strip() for arg in args_str.split(",") if arg.strip()]
+        return_type = return_type.strip()
+
+        for arg in args:
+            if ":" in arg:
+                arg_name, arg_type = map(str.strip, arg.split(":", 1))
+                yield [module, func_name, return_type,
+                       arg_name, arg_type, "RightTyper", "", ""]
+
+def righttyper_rows(path):
+    """Yields final-report rows (without SL_No) from the signature diffs in righttyper.out."""
+    if not Path(path).exists():
+        return
+    with open(path) as f:
+        current_module = ""
+        for line in f:
+            line = line.strip()
+            if line.endswith(".py:"):
+                current_module = Path(line[:-1]).name
+            elif line.startswith("+ def "):
+                yield from signature_rows(current_module, line[6:])
+
+def observation_rows(observations):
+    """Yields final-report rows (without SL_No) from RightTyper's JSON observations."""
+    for observation in observations:
+        module = Path(observation["file"]).name
+        for arg in observation["args"]:
+            yield [module, observation["function"], observation["return_annotation"],
+                   arg["name"], arg["annotation"], "RightTyper", "", ""]
+
+def read_observations(path):
+    """Lazily reads the JSON-lines observations written by RightTyper."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# ------------------ Structured records ------------------
+def record_rows(records):
+    """Yields final-report rows (without SL_No) from the AnnotationRecords of any stage."""
+    for record in records:
+        if record.annotator == "AST":
+            yield [record.module, record.label, record.type, "", "", "AST", "", ""]
+        elif record.annotator == "Conditional":
+            # Same wording as the conditional runtime report, so both routes produce identical rows.
+            name = f"{record.qualname}.{record.name}" if record.qualname else record.name
+            yield [record.module, f"Variable '{name}' is inferred as type: {record.type}", "Unknown",
+                   "", "", "Conditional", "", ""]
+        elif record.annotator == "var_annotator":
+            yield [record.module, record.qualname, "", "", "", "var_annotator", record.name, record.type]
+
+def read_record_files(files):
+    """Lazily reads the records of several JSON-lines files."""
+    for file in files:
+        yield from read_records(file)
+
+def fresh_record_files(sources):
+    """The records the stages wrote for changed source files; raises if any stage has not written them.
+
+    A missing file means its stage did not run on the module, and splicing would
+    silently replace the module's rows with nothing. Sources that no longer exist
+    are deleted modules, which have no records.
+    """
+    sources = [source for source in sources if Path(source).exists()]
+    ast = [stage_path(source, AST_RECORDS) for source in sources]
+    conditional = [stage_path(source, CONDITIONAL_RECORDS) for source in sources]
+    expected = [*ast, *conditional, variable_record_file] if sources else []
+    missing = [path for path in expected if not Path(path).exists()]
+    if missing:
+        raise FileNotFoundError(f"No fresh annotator output to splice: {', '.join(missing)}")
+    return ast, conditional
+
+def collect_rows(sources=None, use_records=False):
+    """Lazily yields the rows of every annotator, optionally restricted to the given source files.
+
+    With use_records the stages are read from their JSON-lines records (and
+    RightTyper from its observations, when present) instead of being scraped
+    from the text reports. Source files are always read from the records the
+    stages write next to them, so a splice sees exactly what was just produced;
+    sources that no longer exist yield no rows.
+    """
+    modules = None if sources is None else {Path(source).name for source in sources if Path(source).exists()}
+    if sources is not None:
+        ast, conditional = fresh_record_files(sources)
+        static_rows = record_rows(itertools.chain(
+            read_record_files(ast),
+            read_record_files(conditional),
+            read_records(variable_record_file) if modules else (),
+        ))
+    elif use_records:
+        static_rows = record_rows(itertools.chain(
+            read_record_files(ast_record_files),
+            read_record_files(conditional_record_files),
+            read_records(variable_record_file),
+        ))
+    else:
+        static_rows = itertools.chain(
+            ast_rows(ast_files),
+            conditional_rows(conditional_files),
+            variable_rows(variable_file),
+        )
+
+    if use_records and Path(righttyper_json_path).exists():
+        dynamic_rows = observation_rows(read_observations(righttyper_json_path))
+    else:
+        dynamic_rows = righttyper_rows(righttyper_path)
+
+    rows = itertools.chain(static_rows, dynamic_rows)
+    if modules is None:
+        return rows
+    return (row for row in rows if row[0] in modules)
 
 # ------------------ Final CSV Output ------------------
-df = pd.DataFrame(final_data, columns=[
-    "SL_No", "Module", "Function", "Function_Return_Type",
-    "Function_Arguments", "Function_Argument_Type", "Annotator_Type",
-    "Variable_Name", "Variable_Type"
-])
-df.to_csv(output_csv, index=False)
-print(f"✅ Final annotation report generated at: {output_csv}")
+def report_writer(f):
+    """Returns the CSV writer used for the final report."""
+    return csv.writer(f, lineterminator=os.linesep)
+
+def write_report(rows, path=output_csv):
+    """Streams the rows to the final report, numbering them as they are written.
+
+    Only one row is held at a time, so memory stays flat whatever the report size.
+    The rows go to a temporary file that replaces the report once complete, so a
+    failing stage never leaves a truncated report behind.
+    """
+    tmp_path = f"{path}.tmp"
+    with metrics.span("write", path, stage="merge"), open(tmp_path, "w", newline="") as f:
+        writer = report_writer(f)
+        writer.writerow(COLUMNS)
+        for sl_no, row in enumerate(rows, start=1):
+            writer.writerow([sl_no, *row])
+    os.replace(tmp_path, path)
+
+def splice_report(rows, modules, path=output_csv):
+    """Replaces the rows of the given modules in an existing final report and renumbers it.
+
+    Fresh rows take the place of the old rows of the same annotator and module,
+    so untouched modules keep their order; groups that are new are appended, and
+    the old rows of a module without fresh ones (e.g. a deleted one) are dropped.
+    """
+    if not Path(path).exists():
+        write_report(rows, path)
+        return
+
+    fresh = {}
+    for row in rows:
+        fresh.setdefault((row[5], row[0]), []).append(row)
+
+    tmp_path = f"{path}.tmp"
+    with metrics.span("write", path, stage="merge"), open(path, newline="") as src, open(tmp_path, "w", newline="") as dst:
+        reader = csv.reader(src)
+        writer = report_writer(dst)
+        next(reader, None)
+        writer.writerow(COLUMNS)
+        sl_no = 0
+        for record in reader:
+            if not record:
+                continue
+            if record[1] in modules:
+                replaced = fresh.pop((record[6], record[1]), [])
+            else:
+                replaced = [record[1:]]
+            for row in replaced:
+                sl_no += 1
+                writer.writerow([sl_no, *row])
+        for group in fresh.values():
+            for row in group:
+                sl_no += 1
+                writer.writerow([sl_no, *row])
+    os.replace(tmp_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the final annotation report combining all tools.")
+    parser.add_argument("--splice", nargs="+", metavar="file.py",
+                        help="Only refresh the rows of these modules in the existing report, from the records "
+                             "the annotators wrote next to them; the rows of files that no longer exist are removed.")
+    parser.add_argument("--records", action="store_true",
+                        help="Merge the JSON-lines records and observations of the annotators instead of their text reports.")
+    args = parser.parse_args()
+
+    if args.splice:
+        modules = {Path(file).name for file in args.splice}
+        try:
+            rows = collect_rows(args.splice, args.records)
+        except FileNotFoundError as e:
+            sys.exit(f"Error: {e}")
+        splice_report(rows, modules)
+    else:
+        write_report(collect_rows(use_records=args.records))
+    print(f"✅ Final annotation report generated at: {output_csv}")
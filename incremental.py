@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+MANIFEST_FILE = ".annotator_manifest.json"
+
+def file_stamp(file_path: str) -> List[int]:
+    """Returns the (mtime_ns, size) pair used to detect a modified file."""
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def load_manifest(manifest_path: str = MANIFEST_FILE) -> Dict[str, List[int]]:
+    """Loads the file stamps recorded by the last successful run."""
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+    return {}
+
+def save_manifest(files: List[str], manifest_path: str = MANIFEST_FILE) -> None:
+    """Records the current stamps of the given files, keeping those of other files that still exist."""
+    manifest = {path: stamp for path, stamp in load_manifest(manifest_path).items() if os.path.exists(path)}
+    for file_path in files:
+        if os.path.exists(file_path):
+            manifest[os.path.abspath(file_path)] = file_stamp(file_path)
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+
+def changed_by_mtime(files: List[str], manifest_path: str = MANIFEST_FILE) -> List[str]:
+    """Returns the files whose mtime or size differs from the manifest."""
+    manifest = load_manifest(manifest_path)
+    return [
+        file_path for file_path in files
+        if os.path.exists(file_path) and manifest.get(os.path.abspath(file_path)) != file_stamp(file_path)
+    ]
+
+def deleted_files(manifest_path: str = MANIFEST_FILE) -> List[str]:
+    """Returns the files annotated by an earlier run that no longer exist, whose rows must go."""
+    return [path for path in load_manifest(manifest_path) if not os.path.exists(path)]
+
+def changed_by_git(files: List[str], base_ref: str = "HEAD") -> List[str]:
+    """Returns the files that differ from base_ref, including untracked ones, according to git."""
+    def git(*git_args: str) -> str:
+        return subprocess.run(["git", *git_args], capture_output=True, text=True, check=True).stdout
+
+    # git prints paths relative to the repository root.
+    top = git("rev-parse", "--show-toplevel").strip()
+    listed = git("diff", "--name-only", base_ref) + git("ls-files", "--others", "--exclude-standard", "--full-name")
+    changed = {os.path.realpath(os.path.join(top, line)) for line in listed.splitlines() if line}
+    return [file_path for file_path in files if os.path.realpath(file_path) in changed]
+
+def with_dependents(files: List[str], changed: List[str], cache=None) -> List[str]:
+    """Adds to the changed files those of `files` that import them, directly or not, whose types can change with them."""
+    if not changed:
+        return changed
+    from return_index import build_return_index
+    dependents = build_return_index(files, cache).dependents(changed)
+    return [*changed, *(file_path for file_path in files
+                        if os.path.abspath(file_path) in dependents and file_path not in changed)]
+
+def changed_files(files: List[str], base_ref: Optional[str] = None, manifest_path: str = MANIFEST_FILE) -> List[str]:
+    """Returns the subset of files that need re-annotation, from git when base_ref is given, else from mtimes."""
+    if base_ref is not None:
+        return changed_by_git(files, base_ref)
+    return changed_by_mtime(files, manifest_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the files that changed since the last annotation run (or a git ref)."
+    )
+    parser.add_argument("files", nargs="*", metavar="file.py")
+    parser.add_argument("--git", dest="base_ref", metavar="REF",
+                        help="Use 'git diff --name-only REF' instead of the mtime manifest.")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help=f"mtime manifest (default: {MANIFEST_FILE}).")
+    parser.add_argument("--update", action="store_true",
+                        help="Record the current state of the files as annotated and exit.")
+    parser.add_argument("--dependents", action="store_true",
+                        help="Also print the files that import a changed one, directly or not.")
+    parser.add_argument("--deleted", action="store_true",
+                        help="Print the files of the manifest that no longer exist instead.")
+    args = parser.parse_args()
+
+    if args.deleted:
+        print(" ".join(deleted_files(args.manifest)))
+        sys.exit(0)
+    if not args.files:
+        parser.error("the following arguments are required: file.py")
+    if args.update:
+        save_manifest(args.files, args.manifest)
+        sys.exit(0)
+
+    changed = changed_files(args.files, args.base_ref, args.manifest)
+    if args.dependents:
+        changed = with_dependents(args.files, changed)
+    print(" ".join(changed))
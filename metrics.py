@@ -0,0 +1,141 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Instrumentation is off unless enable() is called; spans then cost one flag check.
+_enabled = False
+_origin = 0.0
+# Open spans, innermost last
+_stack: List[Dict[str, Any]] = []
+# Finished spans, in completion order
+_spans: List[Dict[str, Any]] = []
+
+def enable() -> None:
+    """Starts recording spans and tracing allocations."""
+    global _enabled, _origin
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _origin = time.perf_counter()
+    _enabled = True
+
+def is_enabled() -> bool:
+    return _enabled
+
+@contextmanager
+def span(phase: str, file: Optional[str] = None, stage: Optional[str] = None) -> Iterator[None]:
+    """Records the wall time and peak traced memory of a block.
+
+    The stage defaults to that of the enclosing span, so a parse triggered by an
+    analyzer is attributed to that analyzer. Nested spans are subtracted from
+    their parent's self time.
+    """
+    if not _enabled:
+        yield
+        return
+
+    if _stack:
+        # Fold the peak reached so far into the parent before resetting it for this span.
+        _stack[-1]["peak"] = max(_stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    current = tracemalloc.get_traced_memory()[0]
+    entry = {
+        "phase": phase,
+        "stage": stage or (_stack[-1]["stage"] if _stack else "main"),
+        "file": file or (_stack[-1]["file"] if _stack else None),
+        "start": time.perf_counter(),
+        "children": 0.0,
+        "mem_start": current,
+        "peak": current,
+        "counters": {},
+    }
+    _stack.append(entry)
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _stack.pop()
+        entry["peak"] = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+        entry["duration"] = end - entry["start"]
+        entry["self"] = entry["duration"] - entry["children"]
+        if _stack:
+            _stack[-1]["children"] += entry["duration"]
+            _stack[-1]["peak"] = max(_stack[-1]["peak"], entry["peak"])
+        _spans.append(entry)
+
+def count(**counters: int) -> None:
+    """Adds to counters (e.g. bytes_read) of the innermost open span."""
+    if _enabled and _stack:
+        totals = _stack[-1]["counters"]
+        for name, value in counters.items():
+            totals[name] = totals.get(name, 0) + value
+
+def take_spans() -> List[Dict[str, Any]]:
+    """Removes and returns the finished spans, tagged with this process id, for add_spans in another process."""
+    pid = os.getpid()
+    taken = [{**entry, "pid": entry.get("pid", pid)} for entry in _spans]
+    _spans.clear()
+    return taken
+
+def add_spans(entries: List[Dict[str, Any]]) -> None:
+    """Adds spans finished in a worker process (see take_spans) to this process's summary and trace."""
+    if _enabled:
+        _spans.extend(entries)
+
+def summary() -> Dict[str, Any]:
+    """Aggregates the recorded spans per stage and per (stage, file).
+
+    Times are self times in seconds per phase (parse, infer, exec, write, ...);
+    peak_bytes is the largest allocation growth seen within any span.
+    """
+    stages: Dict[str, Dict[str, Any]] = {}
+    files: Dict[tuple, Dict[str, Any]] = {}
+
+    for entry in _spans:
+        targets = [stages.setdefault(entry["stage"], {"files": set()})]
+        if entry["file"]:
+            targets[0]["files"].add(entry["file"])
+            targets.append(files.setdefault((entry["stage"], entry["file"]), {}))
+        for target in targets:
+            key = f"{entry['phase']}_s"
+            target[key] = target.get(key, 0.0) + entry["self"]
+            target["peak_bytes"] = max(target.get("peak_bytes", 0), entry["peak"] - entry["mem_start"])
+            for name, value in entry["counters"].items():
+                target[name] = target.get(name, 0) + value
+
+    for totals in stages.values():
+        totals["files"] = len(totals["files"])
+    return {
+        "stages": stages,
+        "files": [{"stage": stage, "file": file, **values} for (stage, file), values in files.items()],
+    }
+
+def trace_events() -> Dict[str, Any]:
+    """Returns the spans in Chrome trace-event format, as loaded by Perfetto or chrome://tracing."""
+    pid = os.getpid()
+    return {
+        "traceEvents": [
+            {
+                "name": f"{entry['stage']}:{entry['phase']}",
+                "cat": entry["stage"],
+                "ph": "X",
+                "ts": (entry["start"] - _origin) * 1e6,
+                "dur": entry["duration"] * 1e6,
+                "pid": entry.get("pid", pid),
+                "tid": 0,
+                "args": {"file": entry["file"], "peak_bytes": entry["peak"] - entry["mem_start"], **entry["counters"]},
+            }
+            for entry in _spans
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+def write_reports(prefix: str) -> None:
+    """Writes <prefix>.json (summary) and <prefix>.trace.json (trace events)."""
+    with open(f"{prefix}.json", "w") as file:
+        json.dump(summary(), file, indent=4)
+    with open(f"{prefix}.trace.json", "w") as file:
+        json.dump(trace_events(), file)
+    print(f"Profile written to {prefix}.json and {prefix}.trace.json")
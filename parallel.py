@@ -0,0 +1,47 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+from result_cache import ResultCache, cached_rows
+
+# Result cache and analysis of the current worker process, set once by _init_worker.
+_worker_cache: Optional[ResultCache] = None
+_worker_analyze: Optional[Callable[[str], Sequence[Sequence]]] = None
+
+def _init_worker(cache_dir: Optional[str], max_bytes: int, analyze: Callable[[str], Sequence[Sequence]]) -> None:
+    global _worker_cache, _worker_analyze
+    _worker_cache = ResultCache(cache_dir, max_bytes) if cache_dir else None
+    _worker_analyze = analyze
+
+def _analyze_in_worker(analyzer: str, file_path: str) -> List[tuple]:
+    return cached_rows(_worker_cache, analyzer, file_path, _worker_analyze)
+
+def resolve_jobs(jobs: int) -> int:
+    """Maps a --jobs value to a worker count; 0 means one worker per CPU."""
+    return jobs if jobs > 0 else os.cpu_count() or 1
+
+def analyze_files(files: Iterable[str], analyzer: str, analyze: Callable[[str], Sequence[Sequence]],
+                  jobs: int = 1, cache: Optional[ResultCache] = None) -> Iterator[List[tuple]]:
+    """Yields the (cached) rows of every file, in input order, using up to `jobs` worker processes.
+
+    `analyze` must be a module-level function (or a partial of one) so it can be
+    sent to the workers; it is sent once per worker, with whatever data it binds.
+    Files are submitted through a bounded window, so results start flowing before
+    `files` is exhausted and a lazy iterable is never materialised.
+    """
+    jobs = resolve_jobs(jobs)
+    if jobs == 1:
+        for file_path in files:
+            yield cached_rows(cache, analyzer, file_path, analyze)
+        return
+
+    initargs = (cache.cache_dir, cache.max_bytes, analyze) if cache is not None else (None, 0, analyze)
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=initargs) as executor:
+        pending = deque()
+        for file_path in files:
+            pending.append(executor.submit(_analyze_in_worker, analyzer, file_path))
+            if len(pending) >= jobs * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
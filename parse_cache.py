@@ -0,0 +1,102 @@
+import ast
+import hashlib
+import importlib.util
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+import metrics
+
+# Bounds of the caches below; the least recently used entries are dropped beyond them.
+# size_for() grows them to hold every file of a run.
+MAX_SOURCE_CHARS = 64 * 1024 * 1024
+MAX_TREES = 256
+# Rough size of a parsed module per character of its source, and the share of
+# the available memory size_for() lets the sources and trees take.
+TREE_BYTES_PER_CHAR = 48
+MEMORY_SHARE = 0.25
+
+# Absolute path -> ((mtime_ns, size), source, content digest), least recently used first
+_sources: "OrderedDict[str, Tuple[Tuple[int, int], str, str]]" = OrderedDict()
+_source_chars = 0
+# (absolute path, content digest) -> parsed module, least recently used first
+_trees: "OrderedDict[Tuple[str, str], ast.Module]" = OrderedDict()
+
+def read_source(file_path: str) -> Tuple[str, str]:
+    """Reads a Python file once per run (while it stays cached) and returns its source and content hash."""
+    global _source_chars
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _sources.get(path)
+    if cached is not None and cached[0] == stamp:
+        _sources.move_to_end(path)
+        return cached[1], cached[2]
+
+    with metrics.span("read", file_path), open(path, "rb") as file:
+        data = file.read()
+        metrics.count(bytes_read=len(data))
+    digest = hashlib.sha256(data).hexdigest()
+    # Honours PEP 263 coding cookies and normalises newlines like the import system does.
+    source = importlib.util.decode_source(data)
+    if cached is not None:
+        _source_chars -= len(cached[1])
+    _sources[path] = (stamp, source, digest)
+    _sources.move_to_end(path)
+    _source_chars += len(source)
+    while _source_chars > MAX_SOURCE_CHARS and len(_sources) > 1:
+        _source_chars -= len(_sources.popitem(last=False)[1][1])
+    return source, digest
+
+def file_digest(file_path: str) -> str:
+    """Returns the content hash of a file, reading it at most once per run."""
+    return read_source(file_path)[1]
+
+def get_tree(file_path: str) -> ast.Module:
+    """Returns the parsed AST of a file, parsing each distinct content only once per run (while it stays cached)."""
+    source, digest = read_source(file_path)
+    key = (os.path.abspath(file_path), digest)
+    tree = _trees.get(key)
+    if tree is None:
+        with metrics.span("parse", file_path):
+            tree = ast.parse(source, filename=file_path)
+        _trees[key] = tree
+        if len(_trees) > MAX_TREES:
+            _trees.popitem(last=False)
+    else:
+        _trees.move_to_end(key)
+    return tree
+
+def available_memory() -> Optional[int]:
+    """Bytes of physical memory available (or installed, where that is all the platform reports)."""
+    for name in ("SC_AVPHYS_PAGES", "SC_PHYS_PAGES"):
+        try:
+            return os.sysconf(name) * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, OSError, ValueError):
+            continue
+    return None
+
+def size_for(files: Iterable[str]) -> None:
+    """Grows the bounds to hold the sources and trees of every file of a run.
+
+    Stages run one after the other over all the files, so with fewer trees kept
+    than files each stage would parse every file again. The bounds only grow,
+    and only as far as MEMORY_SHARE of the available memory allows.
+    """
+    global MAX_SOURCE_CHARS, MAX_TREES
+    sizes = [os.path.getsize(path) for path in {os.path.abspath(path) for path in files} if os.path.isfile(path)]
+    memory = available_memory()
+    if not sizes or memory is None:
+        return
+    total = sum(sizes)
+    budget = memory * MEMORY_SHARE
+    MAX_SOURCE_CHARS = max(MAX_SOURCE_CHARS, int(min(total, budget)))
+    tree_bytes = max(total, 1) * TREE_BYTES_PER_CHAR / len(sizes)
+    MAX_TREES = max(MAX_TREES, min(len(sizes), int(max(budget - total, 0) // tree_bytes)))
+
+def clear() -> None:
+    """Drops every cached source and tree."""
+    global _source_chars
+    _sources.clear()
+    _source_chars = 0
+    _trees.clear()
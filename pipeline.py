@@ -0,0 +1,135 @@
+import argparse
+import itertools
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import AST_Annotator
+import conditional_annotator
+import generate_csv
+import metrics
+import parse_cache
+import var_annotator
+from discovery import add_discovery_arguments, discover
+from incremental import MANIFEST_FILE, changed_files, deleted_files, save_manifest, with_dependents
+from result_cache import ResultCache, add_cache_arguments, open_cache
+
+def run_righttyper(script: str, script_args: Sequence[str] = ()) -> Optional[list]:
+    """Runs RightTyper on a script in this process and returns its observations."""
+    try:
+        from righttyper.righttyper import collect_observations
+    except ImportError as e:
+        print(f"RightTyper is not available in this interpreter: {e}")
+        return None
+
+    # RightTyper rewrites sys.argv for the traced script.
+    saved_argv = sys.argv[:]
+    try:
+        return collect_observations(script, script_args)
+    finally:
+        sys.argv = saved_argv
+
+def run_pipeline(files: List[str], output_csv: str = generate_csv.output_csv,
+                 cache: Optional[ResultCache] = None, righttyper_script: Optional[str] = None,
+                 splice: bool = False, jobs: int = 1, preload: Sequence[str] = (),
+                 timeout: float = conditional_annotator.DEFAULT_TIMEOUT,
+                 memory_mb: int = conditional_annotator.DEFAULT_MEMORY_MB, local_samples: int = 0,
+                 deleted: Sequence[str] = (), index_files: Optional[List[str]] = None) -> None:
+    """Runs every annotator on the files in this process and writes the final report.
+
+    Stage results are handed to the merger in memory; with splice=True only the
+    rows of the given files are replaced in an existing report, and those of the
+    deleted files are removed. Calls resolve through the return index of
+    index_files (by default of the files themselves).
+    """
+    existing = []
+    for file_path in files:
+        if os.path.exists(file_path):
+            existing.append(file_path)
+        else:
+            print(f"File not found: {file_path}")
+    modules = {Path(file_path).name for file_path in existing}
+
+    if righttyper_script:
+        with metrics.span("trace", righttyper_script, stage="RightTyper"):
+            observations = run_righttyper(righttyper_script)
+        righttyper_rows = generate_csv.observation_rows(observations or [])
+    else:
+        righttyper_rows = generate_csv.righttyper_rows(generate_csv.righttyper_path)
+
+    # The stages run lazily, in report order, while the merger streams their rows out.
+    records = itertools.chain(
+        AST_Annotator.iter_annotations(existing, jobs, cache),
+        conditional_annotator.iter_runtime_annotations(existing, jobs=jobs, timeout=timeout, memory_mb=memory_mb,
+                                                       preload=preload, local_samples=local_samples),
+        var_annotator.iter_variables(existing, jobs, cache, index_files=index_files),
+    )
+    rows = itertools.chain(
+        generate_csv.record_rows(records),
+        # RightTyper reports every traced file; keep the ones being annotated.
+        (row for row in righttyper_rows if row[0] in modules),
+    )
+    if splice:
+        generate_csv.splice_report(rows, modules | {Path(file_path).name for file_path in deleted}, output_csv)
+    else:
+        generate_csv.write_report(rows, output_csv)
+    print(f"✅ Final annotation report generated at: {output_csv}")
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the pipeline options to an argparse parser."""
+    add_discovery_arguments(parser)
+    parser.add_argument("-o", "--output", default=generate_csv.output_csv,
+                        help=f"Final report path (default: {generate_csv.output_csv}).")
+    parser.add_argument("--righttyper", metavar="SCRIPT",
+                        help="Trace SCRIPT with RightTyper in-process instead of reading righttyper.out.")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Only re-annotate files changed since the last run and splice them into the report.")
+    parser.add_argument("--git", dest="base_ref", metavar="REF",
+                        help="With --changed-only, diff against a git ref instead of the mtime manifest.")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help=f"mtime manifest (default: {MANIFEST_FILE}).")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes for the static annotators (0: one per CPU).")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="Record per-stage, per-file timings, bytes read and peak memory to PREFIX.json "
+                             "and a Chrome trace to PREFIX.trace.json (work done in the static annotators' "
+                             "--jobs workers is not traced).")
+    conditional_annotator.add_limit_arguments(parser)
+    conditional_annotator.add_preload_argument(parser)
+    conditional_annotator.add_local_samples_argument(parser)
+    add_cache_arguments(parser)
+
+def run_from_args(args: argparse.Namespace) -> None:
+    """Runs the pipeline as configured by add_arguments options."""
+    if args.profile:
+        metrics.enable()
+    cache = open_cache(args)
+    # The report needs the full module list up front, so discovery is not streamed here.
+    files = list(discover(args))
+    # Each stage walks all the files, so keep every tree for the next one.
+    parse_cache.size_for(files)
+    preload = conditional_annotator.preload_names(args.preload)
+    if not args.changed_only:
+        run_pipeline(files, args.output, cache, args.righttyper, jobs=args.jobs, preload=preload,
+                     timeout=args.timeout, memory_mb=args.memory_mb, local_samples=args.local_samples)
+    else:
+        # Files importing a changed one can resolve calls differently, so they are re-annotated too.
+        changed = with_dependents(files, changed_files(files, args.base_ref, args.manifest), cache)
+        deleted = deleted_files(args.manifest)
+        if not changed and not deleted:
+            print("No changed modules to annotate.")
+        else:
+            run_pipeline(changed, args.output, cache, args.righttyper, splice=True, jobs=args.jobs, preload=preload,
+                         timeout=args.timeout, memory_mb=args.memory_mb, local_samples=args.local_samples,
+                         deleted=deleted, index_files=files)
+            save_manifest(files, args.manifest)
+    if args.profile:
+        metrics.write_reports(args.profile)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the full annotation pipeline in a single process.")
+    add_arguments(parser)
+    run_from_args(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import json
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+import metrics
+
+# Suffixes of the per-source outputs of each stage, written next to the source file
+AST_REPORT = "_AST_report.csv"
+AST_RECORDS = "_AST_records.jsonl"
+CONDITIONAL_REPORT = "_conditional_runtime_annotation_report.txt"
+CONDITIONAL_RECORDS = "_conditional_records.jsonl"
+IMPORT_REPORT = "_conditional_import_report.txt"
+
+def stage_path(source_path: str, suffix: str) -> str:
+    """The path of a stage output for a source file: next to it, with '.py' replaced by suffix."""
+    path = Path(source_path)
+    return str(path.with_name(path.stem + suffix))
+
+class AnnotationRecord(NamedTuple):
+    """One finding of an annotator, keyed by (module, qualname, lineno).
+
+    Every stage writes these as JSON lines next to its human-oriented report,
+    so the merger can consume them without scraping text.
+    """
+    file: str
+    annotator: str
+    qualname: str  # Enclosing function or class, "" at module level
+    lineno: int
+    kind: str  # "variable", "argument" or "return"
+    name: str
+    type: str
+
+    @property
+    def module(self) -> str:
+        return Path(self.file).name
+
+    @property
+    def label(self) -> str:
+        """The name as the AST report shows it, e.g. 'add_task (arg: due_date)'."""
+        function = self.qualname.rsplit(".", 1)[-1]
+        if self.kind == "argument":
+            return f"{function} (arg: {self.name})"
+        if self.kind == "return":
+            return f"{function} (return)"
+        return self.name
+
+def write_records(path: str, records: Iterable[AnnotationRecord]) -> None:
+    """Writes records as JSON lines."""
+    with metrics.span("write", path), open(path, "w", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps(record._asdict()) + "\n")
+
+def read_records(path: str) -> Iterator[AnnotationRecord]:
+    """Lazily reads records written by write_records; a missing file yields nothing."""
+    if not Path(path).exists():
+        return
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield AnnotationRecord(**json.loads(line))
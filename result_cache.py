@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from parse_cache import file_digest
+
+DEFAULT_CACHE_DIR = os.environ.get("ANNOTATOR_CACHE_DIR", ".annotator_cache")
+DEFAULT_CACHE_SIZE_MB = int(os.environ.get("ANNOTATOR_CACHE_SIZE_MB", "256"))
+# Digests per query of get_many, below SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+class ResultCache:
+    """On-disk cache of per-file annotation rows, keyed by analyzer version and content hash.
+
+    Entries live in a SQLite database so several processes can share one cache
+    directory; the least recently used entries are evicted once the stored rows
+    exceed ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(os.path.join(cache_dir, "results.sqlite3"), timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self._transaction(self._create_schema)
+
+    def _create_schema(self) -> None:
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " analyzer TEXT NOT NULL, digest TEXT NOT NULL, rows TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (analyzer, digest))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        # Running total of stored bytes, so eviction never has to scan the table.
+        self.db.execute("CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+        self.db.execute("INSERT OR IGNORE INTO usage VALUES (0, 0)")
+
+    def _transaction(self, work: Callable[[], None]) -> None:
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers
+        # queue on the busy timeout instead of failing half-way through.
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            work()
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def get(self, analyzer: str, digest: str) -> Optional[List[list]]:
+        """Returns the cached rows for a file content, or None on a miss."""
+        found = self.db.execute(
+            "SELECT rows FROM results WHERE analyzer = ? AND digest = ?", (analyzer, digest)
+        ).fetchone()
+        if found is None:
+            return None
+        try:
+            self.db.execute(
+                "UPDATE results SET last_used = ? WHERE analyzer = ? AND digest = ?",
+                (time.time(), analyzer, digest),
+            )
+        except sqlite3.OperationalError:
+            # Recency is best effort; a busy database must not turn a hit into a miss.
+            pass
+        return json.loads(found[0])
+
+    def get_many(self, analyzer: str, digests: Iterable[str]) -> Dict[str, List[list]]:
+        """Returns the cached rows of several contents at once, for the digests that hit."""
+        digests = list(dict.fromkeys(digests))
+        found: Dict[str, List[list]] = {}
+        for start in range(0, len(digests), BATCH_SIZE):
+            batch = digests[start:start + BATCH_SIZE]
+            marks = ", ".join("?" * len(batch))
+            for digest, rows in self.db.execute(
+                f"SELECT digest, rows FROM results WHERE analyzer = ? AND digest IN ({marks})", (analyzer, *batch)
+            ):
+                found[digest] = json.loads(rows)
+            try:
+                self.db.execute(
+                    f"UPDATE results SET last_used = ? WHERE analyzer = ? AND digest IN ({marks})",
+                    (time.time(), analyzer, *batch),
+                )
+            except sqlite3.OperationalError:
+                # Recency is best effort, as in get.
+                pass
+        return found
+
+    def put(self, analyzer: str, digest: str, rows: Sequence[Sequence]) -> None:
+        """Stores the rows for a file content and evicts old entries beyond the size cap."""
+        self.put_many(analyzer, {digest: rows})
+
+    def put_many(self, analyzer: str, entries: Dict[str, Sequence[Sequence]]) -> None:
+        """Stores the rows of several contents in one transaction, then evicts beyond the size cap."""
+        payloads = {digest: json.dumps(rows) for digest, rows in entries.items()}
+
+        def store() -> None:
+            growth = 0
+            now = time.time()
+            for digest, payload in payloads.items():
+                previous = self.db.execute(
+                    "SELECT size FROM results WHERE analyzer = ? AND digest = ?", (analyzer, digest)
+                ).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (analyzer, digest, payload, len(payload), now),
+                )
+                growth += len(payload) - (previous[0] if previous else 0)
+            self.db.execute("UPDATE usage SET total = total + ? WHERE id = 0", (growth,))
+            self._evict()
+
+        self._transaction(store)
+
+    def _evict(self) -> None:
+        total = self.db.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for analyzer, digest, size in self.db.execute(
+            "SELECT analyzer, digest, size FROM results ORDER BY last_used"
+        ):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((analyzer, digest))
+            freed += size
+        self.db.executemany("DELETE FROM results WHERE analyzer = ? AND digest = ?", victims)
+        self.db.execute("UPDATE usage SET total = total - ? WHERE id = 0", (freed,))
+
+    def close(self) -> None:
+        self.db.close()
+
+def cached_rows(cache: Optional[ResultCache], analyzer: str, file_path: str,
+                analyze: Callable[[str], Sequence[Sequence]]) -> List[tuple]:
+    """Returns analyze(file_path), served from the cache when the file content is unchanged.
+
+    Rows are stored without their leading file path, so identical contents at
+    different paths share one entry.
+    """
+    if cache is None:
+        return [tuple(row) for row in analyze(file_path)]
+    try:
+        digest = file_digest(file_path)
+    except (OSError, UnicodeDecodeError):
+        # Let the analyzer report the unreadable file the way it always has.
+        return [tuple(row) for row in analyze(file_path)]
+
+    rows = cache.get(analyzer, digest)
+    if rows is None:
+        rows = [list(row[1:]) for row in analyze(file_path)]
+        cache.put(analyzer, digest, rows)
+    return [(file_path, *row) for row in rows]
+
+def add_cache_arguments(parser) -> None:
+    """Adds the shared result-cache options to an argparse parser."""
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Result cache directory (default: {DEFAULT_CACHE_DIR}).")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f"Size cap of the result cache in MB (default: {DEFAULT_CACHE_SIZE_MB}).")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-analyze every file.")
+
+def open_cache(args) -> Optional[ResultCache]:
+    """Opens the result cache selected by add_cache_arguments options, if any."""
+    if args.no_cache:
+        return None
+    return ResultCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
@@ -0,0 +1,393 @@
+import ast
+import hashlib
+import json
+import os
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from parse_cache import file_digest, get_tree
+from result_cache import ResultCache
+
+# Return types of builtins, used when a call does not resolve to a project function.
+BUILTIN_RETURN_TYPES = {
+    "input": "str",
+    "int": "int",
+    "float": "float",
+    "list": "list",
+    "dict": "dict",
+    "tuple": "tuple",
+    "set": "set",
+}
+# Placeholders for types the index cannot tell; dropped from a union that has real types.
+UNKNOWN_TYPES = {"function_call", "Unknown"}
+
+def literal_type(node: ast.AST) -> Optional[str]:
+    """The type of a literal or comprehension expression, None for any other expression."""
+    if isinstance(node, ast.Constant):
+        return type(node.value).__name__
+    elif isinstance(node, (ast.List, ast.ListComp)):
+        return "list"
+    elif isinstance(node, (ast.Dict, ast.DictComp)):
+        return "dict"
+    elif isinstance(node, ast.Tuple):
+        return "tuple"
+    elif isinstance(node, (ast.Set, ast.SetComp)):
+        return "set"
+    return None
+
+def dotted_name(node: ast.AST) -> Optional[str]:
+    """'a.b.c' for a Name/Attribute chain, None for anything else (calls, subscripts, ...)."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+def module_names(files: Iterable[str]) -> Dict[str, str]:
+    """Maps the absolute path of every file to its dotted module name, as imported from its sys.path root.
+
+    The root of a file is the first directory above it without an __init__.py,
+    so a module's name does not depend on which other files are analyzed with it.
+    """
+    packages: Dict[str, bool] = {}  # Directory -> whether it is a package
+
+    def is_package(directory: str) -> bool:
+        if directory not in packages:
+            packages[directory] = os.path.isfile(os.path.join(directory, "__init__.py"))
+        return packages[directory]
+
+    names = {}
+    for file_path in files:
+        path = os.path.abspath(file_path)
+        directory, filename = os.path.split(path)
+        parts = [] if filename == "__init__.py" else [filename[:-len(".py")]]
+        while is_package(directory) and os.path.dirname(directory) != directory:
+            directory, package = os.path.split(directory)
+            parts.append(package)
+        names[path] = ".".join(reversed(parts)) if parts else filename[:-len(".py")]
+    return names
+
+def format_types(types: Set[str]) -> str:
+    """Renders a set of return types as one type, a Union for several."""
+    known = types - UNKNOWN_TYPES or types
+    if not known:
+        return "function_call"
+    if len(known) == 1:
+        return next(iter(known))
+    return f"Union[{', '.join(sorted(known))}]"
+
+class ReturnTypeIndex:
+    """Return types of every function of a project, solved once over its call graph.
+
+    Functions are keyed "module:qualname". The index is plain data, so it can be
+    sent to worker processes along with the files to annotate.
+    """
+
+    def __init__(self):
+        self.modules: Dict[str, str] = {}  # Absolute file path -> module name
+        self.imports: Dict[str, Dict[str, str]] = {}  # Module -> local name -> imported dotted name
+        self.classes: Set[str] = set()  # "module:qualname" of every class
+        self.types: Dict[str, str] = {}  # "module:qualname" -> return type
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the index, for result-cache keys of analyses that used it."""
+        data = [self.modules, self.imports, sorted(self.classes), self.types]
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+    def resolve(self, module: str, scope: str, func: ast.AST) -> Optional[str]:
+        """The "module:qualname" of the project function or class a call in `scope` refers to, if any."""
+        name = dotted_name(func)
+        if name is None:
+            return None
+        return self.resolve_name(module, scope, name)
+
+    def resolve_name(self, module: str, scope: str, name: str) -> Optional[str]:
+        """Like resolve, for the callee's dotted name."""
+        first, _, rest = name.partition(".")
+
+        if not rest:
+            # Innermost enclosing definition first, then the module level.
+            parts = scope.split(".") if scope else []
+            for depth in range(len(parts), -1, -1):
+                key = f"{module}:{'.'.join(parts[:depth] + [first])}"
+                if key in self.types or key in self.classes:
+                    return key
+        elif first in ("self", "cls") and "." in scope:
+            # A method of the enclosing class (scope is "Class.method").
+            key = f"{module}:{scope.rsplit('.', 1)[0]}.{rest}"
+            if key in self.types:
+                return key
+
+        imported = self.imports.get(module, {}).get(first)
+        if imported is None:
+            return None
+        return self.lookup(f"{imported}.{rest}" if rest else imported)
+
+    def lookup(self, target: str, hops: int = 8) -> Optional[str]:
+        """The "module:qualname" of a fully dotted name, following re-exports such as a package's imports."""
+        # Split into the longest project module and the qualname inside it.
+        parts = target.split(".")
+        for split in range(len(parts) - 1, 0, -1):
+            module, qualname = ".".join(parts[:split]), ".".join(parts[split:])
+            key = f"{module}:{qualname}"
+            if key in self.types or key in self.classes:
+                return key
+            reexported = self.imports.get(module, {}).get(parts[split])
+            if reexported is not None and hops:
+                rest = parts[split + 1:]
+                return self.lookup(".".join([reexported, *rest]), hops - 1)
+        return None
+
+    def call_type(self, file_path: str, scope: str, func: ast.AST) -> Optional[str]:
+        """The return type of a call made in a file, or None when it is not a project function or class."""
+        name = dotted_name(func)
+        if name is None:
+            return None
+        return self.name_type(file_path, scope, name)
+
+    def name_type(self, file_path: str, scope: str, name: str) -> Optional[str]:
+        """Like call_type, for the callee's dotted name."""
+        module = self.modules.get(os.path.abspath(file_path))
+        if module is None:
+            return None
+        key = self.resolve_name(module, scope, name)
+        if key is None:
+            return None
+        if key in self.classes:
+            return key.split(":", 1)[1].rsplit(".", 1)[-1]
+        return self.types[key]
+
+    def dependents(self, files: Iterable[str]) -> Set[str]:
+        """Absolute paths of the other indexed files that import the given ones, directly or through other modules.
+
+        Their calls may resolve into the given files, so their inferred types can
+        change with them.
+        """
+        paths = {module: path for path, module in self.modules.items()}
+        importers: Dict[str, Set[str]] = defaultdict(set)
+        for module, imports in self.imports.items():
+            for dotted in imports.values():
+                # The longest project module the imported name lies in.
+                parts = dotted.split(".")
+                for end in range(len(parts), 0, -1):
+                    if ".".join(parts[:end]) in paths:
+                        importers[".".join(parts[:end])].add(module)
+                        break
+        start = {self.modules[path] for path in map(os.path.abspath, files) if path in self.modules}
+        seen = set(start)
+        todo = list(start)
+        while todo:
+            for importer in importers[todo.pop()]:
+                if importer not in seen:
+                    seen.add(importer)
+                    todo.append(importer)
+        return {paths[module] for module in seen - start}
+
+    def function_type(self, file_path: str, qualname: str) -> Optional[str]:
+        """The solved return type of a function defined in a file."""
+        module = self.modules.get(os.path.abspath(file_path))
+        return self.types.get(f"{module}:{qualname}")
+
+def function_returns(node: ast.AST) -> Tuple[List[Optional[ast.expr]], bool]:
+    """The values of the function's own return statements (None for a bare return) and whether it yields."""
+    returns = []
+    yields = False
+    todo = list(ast.iter_child_nodes(node))
+    while todo:
+        child = todo.pop()
+        # Nested definitions return and yield for themselves.
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(child, ast.Return):
+            returns.append(child.value)
+        elif isinstance(child, (ast.Yield, ast.YieldFrom)):
+            yields = True
+        todo.extend(ast.iter_child_nodes(child))
+    return returns, yields
+
+def local_values(node: ast.AST) -> Dict[str, List[ast.expr]]:
+    """The values assigned to each plain local name of a function, outside nested definitions."""
+    values: Dict[str, List[ast.expr]] = defaultdict(list)
+    todo = list(ast.iter_child_nodes(node))
+    while todo:
+        child = todo.pop()
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(child, ast.Assign):
+            for target in child.targets:
+                if isinstance(target, ast.Name):
+                    values[target.id].append(child.value)
+        elif isinstance(child, ast.AnnAssign) and isinstance(child.target, ast.Name) and child.value is not None:
+            values[child.target.id].append(child.value)
+        todo.extend(ast.iter_child_nodes(child))
+    return values
+
+# Analyzer key of the cached per-file facts the index is solved from
+FACTS_VERSION = "return_index/1"
+
+def file_facts(path: str, module: str) -> List[list]:
+    """The facts of one file the index needs, as cacheable rows that do not depend on other files.
+
+    Rows are ["import", local name, dotted name], ["class", qualname] and
+    ["function", qualname, literal return types, dotted names of returned calls].
+    """
+    tree = get_tree(path)
+    facts: List[list] = []
+    is_package = os.path.basename(path) == "__init__.py"
+    package = module if is_package else module.rpartition(".")[0]
+    todo = [(tree, "")]
+    while todo:
+        node, scope = todo.pop()
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.Import):
+                for alias in child.names:
+                    facts.append(["import", alias.asname or alias.name.split(".")[0],
+                                  alias.name if alias.asname else alias.name.split(".")[0]])
+            elif isinstance(child, ast.ImportFrom):
+                base = child.module or ""
+                if child.level:
+                    # Relative import: climb from this module's package.
+                    anchor = package.split(".")[:len(package.split(".")) - child.level + 1] if package else []
+                    base = ".".join(anchor + ([base] if base else []))
+                for alias in child.names:
+                    facts.append(["import", alias.asname or alias.name, f"{base}.{alias.name}" if base else alias.name])
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{scope}.{child.name}" if scope else child.name
+                if isinstance(child, ast.ClassDef):
+                    facts.append(["class", qualname])
+                else:
+                    facts.append(["function", qualname, *return_facts(child)])
+                todo.append((child, qualname))
+            else:
+                todo.append((child, scope))
+    return facts
+
+def return_facts(node: ast.AST) -> Tuple[List[str], List[str]]:
+    """The literal return types of a function and the dotted names of the calls it returns."""
+    returns, yields = function_returns(node)
+    types: Set[str] = set()
+    calls: Set[str] = set()
+    if yields:
+        types.add("generator")
+    elif not any(value is not None for value in returns):
+        types.add("None")
+    locals_ = None
+
+    def add(value: ast.expr, follow_names: bool = True) -> None:
+        nonlocal locals_
+        literal = literal_type(value)
+        if literal is not None:
+            types.add(literal)
+        elif isinstance(value, ast.Call):
+            name = dotted_name(value.func)
+            if name is None:
+                types.add("function_call")
+            else:
+                calls.add(name)
+        elif isinstance(value, ast.Name) and follow_names:
+            if locals_ is None:
+                locals_ = local_values(node)
+            for assigned in locals_.get(value.id, []):
+                add(assigned, follow_names=False)
+            if value.id not in locals_:
+                types.add("Unknown")
+        else:
+            types.add("Unknown")
+
+    if not yields:
+        for value in returns:
+            if value is None:
+                types.add("None")
+            else:
+                add(value)
+    return sorted(types), sorted(calls)
+
+def build_return_index(files: Iterable[str], cache: Optional[ResultCache] = None) -> ReturnTypeIndex:
+    """Collects the facts of every file, builds the call graph of their functions and solves their return types.
+
+    Each function starts with the types of its literal returns; a returned call
+    (directly or through a local variable) adds an edge to the callee. A worklist
+    then propagates callee types to callers until nothing changes, so every
+    function is re-evaluated only when one of its callees changed. With a cache,
+    only the files whose content or module name changed are parsed again.
+    """
+    index = ReturnTypeIndex()
+    index.modules = module_names(files)
+
+    keys = {}
+    for path, module in index.modules.items():
+        try:
+            keys[path] = hashlib.sha256(f"{module}\0{file_digest(path)}".encode()).hexdigest()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error reading file: {e}")
+    stored = cache.get_many(FACTS_VERSION, keys.values()) if cache is not None else {}
+    fresh = {}
+
+    functions: List[Tuple[str, str, List[str], List[str]]] = []  # (key, module, literal types, call names)
+    for path, key in keys.items():
+        module = index.modules[path]
+        facts = stored.get(key)
+        if facts is None:
+            try:
+                facts = fresh[key] = file_facts(path, module)
+            except (OSError, SyntaxError, UnicodeDecodeError) as e:
+                print(f"Error reading file: {e}")
+                continue
+        imports = index.imports.setdefault(module, {})
+        for fact in facts:
+            if fact[0] == "import":
+                imports[fact[1]] = fact[2]
+            elif fact[0] == "class":
+                index.classes.add(f"{module}:{fact[1]}")
+            else:
+                functions.append((f"{module}:{fact[1]}", module, fact[2], fact[3]))
+                index.types[f"{module}:{fact[1]}"] = "function_call"
+    if fresh and cache is not None:
+        cache.put_many(FACTS_VERSION, fresh)
+
+    # Resolve the returned calls into call edges, now that every module's names are known.
+    static: Dict[str, Set[str]] = {}
+    calls: Dict[str, Set[str]] = {}
+    callers: Dict[str, Set[str]] = defaultdict(set)
+    for key, module, literal_types, call_names in functions:
+        qualname = key.split(":", 1)[1]
+        types = set(literal_types)
+        callees: Set[str] = set()
+        for name in call_names:
+            callee = index.resolve_name(module, qualname, name)
+            if callee in index.classes:
+                types.add(callee.split(":", 1)[1].rsplit(".", 1)[-1])
+            elif callee is not None:
+                callees.add(callee)
+            elif name in BUILTIN_RETURN_TYPES:
+                types.add(BUILTIN_RETURN_TYPES[name])
+            else:
+                types.add("function_call")
+        static[key] = types
+        calls[key] = callees
+        for callee in callees:
+            callers[callee].add(key)
+
+    # Worklist fixed point: types only grow, so this terminates.
+    solved = {key: set(types) for key, types in static.items()}
+    work = deque(static)
+    queued = set(static)
+    while work:
+        key = work.popleft()
+        queued.discard(key)
+        types = set(static[key])
+        for callee in calls[key]:
+            types |= solved[callee]
+        if types != solved[key]:
+            solved[key] = types
+            for caller in callers[key]:
+                if caller not in queued:
+                    queued.add(caller)
+                    work.append(caller)
+
+    index.types = {key: format_types(types) for key, types in solved.items()}
+    return index
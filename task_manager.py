@@ -1,57 +1,69 @@
 # task_manager.py
 
-import json
 import os
-from datetime import datetime
-from typing import Any
+from typing import Any, Optional
+
+from task_store import JsonStore, TaskStore, open_store
 
 TASKS_FILE = "tasks.json"
+# Storage backend: "json" (rewrites tasks.json), "journal" (append-only tasks.jsonl) or "sqlite" (tasks.sqlite3).
+# With journal or sqlite, tasks.json is only read to seed a new store and written by export_tasks
+TASKS_BACKEND = os.environ.get("TASKS_BACKEND", "json")
+
+_store: Optional[TaskStore] = None
 
-# Load tasks from file
+# Open the configured backend once; a new journal or database imports tasks.json
+def get_store() -> TaskStore:
+    global _store
+    if _store is None:
+        _store = open_store(TASKS_BACKEND, TASKS_FILE if TASKS_BACKEND == "json" else None, TASKS_FILE)
+    return _store
+
+# Load all tasks
 def load_tasks() -> Any:
-    if os.path.exists(TASKS_FILE):
-        with open(TASKS_FILE, "r") as file:
-            return json.load(file)
-    return []
+    return get_store().tasks()
 
-# Save tasks to file
+# Replace all tasks
 def save_tasks(tasks) -> None:
-    with open(TASKS_FILE, "w") as file:
-        json.dump(tasks, file, indent=4)
+    get_store().import_tasks(tasks)
+
+# Write all tasks to a tasks.json file
+def export_tasks(path=TASKS_FILE) -> str:
+    JsonStore(path).save(load_tasks())
+    return f"\nTasks exported to {path}."
+
+# Replace all tasks with those of a tasks.json file
+def import_tasks(path=TASKS_FILE) -> str:
+    save_tasks(JsonStore(path).tasks())
+    return f"\nTasks imported from {path}."
 
 # Add a new task
 def add_task(description, due_date, category) -> str:
-    tasks = load_tasks()
-    new_task = {
-        "id": len(tasks) + 1,
-        "description": description,
-        "due_date": due_date,
-        "category": category
-    }
-    tasks.append(new_task)
-    save_tasks(tasks)
+    get_store().add(description, due_date, category)
     return "\nTask added successfully!"
 
-# List tasks sorted by due date
+# List tasks sorted by due date, read from the store's due date index
 def list_tasks() -> str:
-    tasks = load_tasks()
+    tasks = get_store().by_due_date()
     if not tasks:
         return "\nNo tasks found."
     
-    tasks.sort(key=lambda x: datetime.strptime(x["due_date"], "%Y-%m-%d"))
+    table = [[task["id"], task["description"], task["due_date"], task["category"]] for task in tasks]
+    return table
+
+# List tasks due between two dates (YYYY-MM-DD, both included)
+def list_tasks_due(start, end) -> str:
+    tasks = get_store().due_between(start, end)
+    if not tasks:
+        return "\nNo tasks found."
     
     table = [[task["id"], task["description"], task["due_date"], task["category"]] for task in tasks]
     return table
 
 # Flush a specific task by ID
 def flush_task(task_id) -> str:
-    tasks = load_tasks()
-    tasks = [task for task in tasks if task["id"] != task_id]
-    
-    for i, task in enumerate(tasks):
-        task["id"] = i + 1
-
-    save_tasks(tasks)
+    if not get_store().delete(task_id):
+        return "\nTask not found."
     return "\nTask removed successfully!"
 
 # Flush all tasks from the database
@@ -64,5 +76,5 @@ def flush_all_tasks() -> str:
 
 # Delete all tasks
 def delete_all_tasks() -> str:
-    save_tasks([])
+    get_store().clear()
     return "All tasks successfully deleted."
@@ -0,0 +1,445 @@
+# task_store.py
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A journal of at least COMPACT_MIN_OPS lines is compacted once more than this fraction of them is dead
+COMPACT_MIN_OPS = 1000
+COMPACT_DEAD_FRACTION = 0.5
+# Sort position of due dates that are not YYYY-MM-DD: after every real date
+UNDATED = date.max.toordinal() + 1
+
+# Day number of a YYYY-MM-DD due date, parsed once when a task is stored
+def due_ordinal(due_date) -> int:
+    try:
+        return datetime.strptime(due_date, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return UNDATED
+
+# Tasks sorted by (due date ordinal, id). Inserts keep it sorted; removals leave a tombstone,
+# squeezed out once more than COMPACT_DEAD_FRACTION of the entries are dead
+class DueDateIndex:
+    def __init__(self, tasks: List[Dict] = (), ordinals: Optional[List[int]] = None):
+        if ordinals is None:
+            ordinals = [due_ordinal(task["due_date"]) for task in tasks]
+        order = sorted(range(len(tasks)), key=lambda i: (ordinals[i], tasks[i]["id"]))
+        self.keys: List[Tuple[int, int]] = [(ordinals[i], tasks[i]["id"]) for i in order]
+        self.tasks: List[Optional[Dict]] = [tasks[i] for i in order]
+        self.dead = 0
+
+    def insert(self, ordinal: int, task: Dict) -> None:
+        index = bisect_right(self.keys, (ordinal, task["id"]))
+        self.keys.insert(index, (ordinal, task["id"]))
+        self.tasks.insert(index, task)
+
+    def remove(self, ordinal: int, task: Dict) -> None:
+        index = bisect_left(self.keys, (ordinal, task["id"]))
+        if index < len(self.tasks) and self.tasks[index] is task:
+            self.tasks[index] = None
+            self.dead += 1
+            if self.dead > COMPACT_DEAD_FRACTION * len(self.tasks):
+                self.squeeze()
+
+    def squeeze(self) -> None:
+        live = [i for i, task in enumerate(self.tasks) if task is not None]
+        self.keys = [self.keys[i] for i in live]
+        self.tasks = [self.tasks[i] for i in live]
+        self.dead = 0
+
+    # Live tasks in order
+    def ordered(self) -> List[Dict]:
+        return [task for task in self.tasks if task is not None]
+
+    # Live tasks due between two ordinals, both included
+    def between(self, start: int, end: int) -> List[Dict]:
+        lo, hi = bisect_left(self.keys, (start,)), bisect_left(self.keys, (end + 1,))
+        return [task for task in self.tasks[lo:hi] if task is not None]
+
+# Common interface of the task storage backends; tasks are dicts kept in id order
+class TaskStore(ABC):
+    @abstractmethod
+    def tasks(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def add(self, description, due_date, category) -> Dict:
+        ...
+
+    # Remove a task; the ids of other tasks never change and are never reused
+    @abstractmethod
+    def delete(self, task_id) -> bool:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    # Replace every task, e.g. from a tasks.json export
+    @abstractmethod
+    def import_tasks(self, tasks: List[Dict]) -> None:
+        ...
+
+    # Tasks in due date order, ties in id order
+    @abstractmethod
+    def by_due_date(self) -> List[Dict]:
+        ...
+
+    # Tasks due between two dates (YYYY-MM-DD, both included), in due date order
+    @abstractmethod
+    def due_between(self, start: str, end: str) -> List[Dict]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+# The tasks of an import with one task per id, the last one given for an id winning
+def unique_tasks(tasks: List[Dict]) -> List[Dict]:
+    return list({task["id"]: dict(task) for task in tasks}.values())
+
+# The whole list in one JSON file, rewritten on every change (the original format). The plain list
+# has nowhere to keep a counter, so the next id to hand out lives in a sidecar file next to it
+class JsonStore(TaskStore):
+    def __init__(self, path: str):
+        self.path = path
+        self.next_path = path + ".next"
+        # (mtime_ns, size) of the file when the due date index was built, and the index
+        self.indexed: Optional[Tuple[Optional[Tuple[int, int]], DueDateIndex]] = None
+
+    def tasks(self) -> List[Dict]:
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                return json.load(file)
+        return []
+
+    def save(self, tasks: List[Dict]) -> None:
+        self.indexed = None
+        with open(self.path, "w") as file:
+            json.dump(tasks, file, indent=4)
+
+    # The next id: past every id handed out, even of tasks deleted since, and every id in the file
+    def next_id(self, tasks: List[Dict]) -> int:
+        try:
+            with open(self.next_path, "r") as file:
+                stored = int(file.read())
+        except (OSError, ValueError):
+            stored = 1
+        return max(stored, max((task["id"] for task in tasks), default=0) + 1)
+
+    # Written before the tasks, so a crash in between at worst skips an id
+    def save_next_id(self, next_id: int) -> None:
+        with open(self.next_path, "w") as file:
+            file.write(str(next_id))
+
+    def add(self, description, due_date, category) -> Dict:
+        tasks = self.tasks()
+        task_id = self.next_id(tasks)
+        task = {"id": task_id, "description": description, "due_date": due_date, "category": category}
+        tasks.append(task)
+        self.save_next_id(task_id + 1)
+        self.save(tasks)
+        return task
+
+    def delete(self, task_id) -> bool:
+        tasks = self.tasks()
+        remaining = [task for task in tasks if task["id"] != task_id]
+        if len(remaining) != len(tasks):
+            self.save_next_id(self.next_id(tasks))
+        self.save(remaining)
+        return len(remaining) != len(tasks)
+
+    def clear(self) -> None:
+        self.save_next_id(self.next_id(self.tasks()))
+        self.save([])
+
+    # Imported ids never lower the next id
+    def import_tasks(self, tasks: List[Dict]) -> None:
+        tasks = unique_tasks(tasks)
+        self.save_next_id(max(self.next_id(self.tasks()), self.next_id(tasks)))
+        self.save(tasks)
+
+    # The due date index of the file's tasks, kept until the file changes (also by another process)
+    def index(self) -> DueDateIndex:
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if self.indexed is None or self.indexed[0] != stamp:
+            self.indexed = (stamp, DueDateIndex(self.tasks()))
+        return self.indexed[1]
+
+    def by_due_date(self) -> List[Dict]:
+        return [dict(task) for task in self.index().ordered()]
+
+    def due_between(self, start: str, end: str) -> List[Dict]:
+        return [dict(task) for task in self.index().between(due_ordinal(start), due_ordinal(end))]
+
+# Live tasks by id, in id order (ids only grow), their due date ordinals and the next id to hand out,
+# as replayed from the lines of a task journal
+class JournalState:
+    def __init__(self):
+        self.items: Dict[int, Dict] = {}
+        self.ordinals: Dict[int, int] = {}
+        self.next_id = 1
+        self.ops = 0
+
+    # Replay the journal's lines, up to byte `end` if given; returns the length of the intact ones
+    def replay(self, path: str, end: Optional[int] = None) -> int:
+        intact = 0
+        with open(path, "rb") as file:
+            for line in file:
+                if end is not None and intact >= end:
+                    break
+                try:
+                    entry = json.loads(line) if line.endswith(b"\n") else None
+                except json.JSONDecodeError:
+                    entry = None
+                if entry is None:
+                    # A line torn by a crash mid-append; everything before it is intact
+                    break
+                self.apply(entry)
+                self.ops += 1
+                intact += len(line)
+        return intact
+
+    def apply(self, entry: Dict) -> None:
+        if entry["op"] == "add":
+            task = entry["task"]
+            self.items[task["id"]] = task
+            self.ordinals[task["id"]] = entry["due"] if "due" in entry else due_ordinal(task["due_date"])
+            self.next_id = max(self.next_id, task["id"] + 1)
+        elif entry["op"] == "delete":
+            self.items.pop(entry["id"], None)
+            self.ordinals.pop(entry["id"], None)
+        elif entry["op"] == "next":
+            # Written by compaction, so ids of deleted tasks are never handed out again
+            self.next_id = max(self.next_id, entry["id"])
+
+# Tasks replayed into memory from an append-only JSON-lines journal; each change appends one line.
+# A delete appends a tombstone and leaves every other id alone; once tombstones and the adds they
+# cancel make up more than COMPACT_DEAD_FRACTION of the journal, it is rewritten in the background.
+class JournalStore(TaskStore):
+    def __init__(self, path: str):
+        self.path = path
+        state = JournalState()
+        if os.path.exists(path):
+            intact = state.replay(path)
+            if intact != os.path.getsize(path):
+                os.truncate(path, intact)
+        self.items, self.ordinals, self.next_id, self.ops = state.items, state.ordinals, state.next_id, state.ops
+        self.index = DueDateIndex(list(self.items.values()), list(self.ordinals.values()))
+        self.file = open(path, "a")
+        # Appends and the final swap of a compaction take the lock
+        self.lock = threading.Lock()
+        self.compactor: Optional[threading.Thread] = None
+        # Journal length at which compaction may start; pushed back after a failed one
+        self.compact_at = COMPACT_MIN_OPS
+
+    def append(self, entry: Dict) -> None:
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.ops += 1
+            dead = self.ops - len(self.items)
+            if self.compactor is None and self.ops >= self.compact_at and dead > COMPACT_DEAD_FRACTION * self.ops:
+                # Only the journal length is taken here: the thread replays the live tasks from the file
+                self.compactor = threading.Thread(target=self.compact, args=(self.file.tell(),),
+                                                  name="task-journal-compaction")
+                self.compactor.start()
+
+    # Thread body of a compaction of the journal's first `end` bytes. A failure leaves the current
+    # journal in place, is reported, and is retried COMPACT_MIN_OPS appends later
+    def compact(self, end: int) -> None:
+        try:
+            state = JournalState()
+            state.replay(self.path, end)
+            self.rewrite(state, end)
+        except Exception as e:
+            print(f"Error compacting task journal {self.path}: {e}")
+            with self.lock:
+                self.compact_at = self.ops + COMPACT_MIN_OPS
+        finally:
+            self.compactor = None
+
+    # Write the next id and one "add" per live task of `state`, then carry over the lines appended after
+    # byte `end` of the current journal and swap the new one in atomically
+    def rewrite(self, state: JournalState, end: int) -> None:
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w") as file:
+                file.write(json.dumps({"op": "next", "id": state.next_id}) + "\n")
+                for task_id, task in state.items.items():
+                    file.write(json.dumps({"op": "add", "task": task, "due": state.ordinals[task_id]}) + "\n")
+                with self.lock:
+                    with open(self.path, "r") as journal:
+                        journal.seek(end)
+                        carried = journal.readlines()
+                    file.writelines(carried)
+                    file.close()
+                    os.replace(temp_path, self.path)
+                    self.file.close()
+                    self.file = open(self.path, "a")
+                    self.ops = 1 + len(state.items) + len(carried)
+                    self.compact_at = COMPACT_MIN_OPS
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    # Wait for a running compaction, e.g. before replacing the whole journal
+    def wait(self) -> None:
+        compactor = self.compactor
+        if compactor is not None:
+            compactor.join()
+
+    def tasks(self) -> List[Dict]:
+        return [dict(task) for task in self.items.values()]
+
+    def add(self, description, due_date, category) -> Dict:
+        task = {"id": self.next_id, "description": description, "due_date": due_date, "category": category}
+        ordinal = due_ordinal(due_date)
+        self.next_id += 1
+        self.items[task["id"]] = task
+        self.ordinals[task["id"]] = ordinal
+        self.index.insert(ordinal, task)
+        self.append({"op": "add", "task": task, "due": ordinal})
+        return dict(task)
+
+    def delete(self, task_id) -> bool:
+        task = self.items.pop(task_id, None)
+        if task is None:
+            return False
+        self.index.remove(self.ordinals.pop(task_id), task)
+        self.append({"op": "delete", "id": task_id})
+        return True
+
+    # Drop every task; ids keep counting up so old references never point at a new task
+    def clear(self) -> None:
+        self.wait()
+        self.items, self.ordinals = {}, {}
+        self.index = DueDateIndex()
+        with self.lock:
+            self.file.truncate(0)
+            self.ops = 0
+        self.append({"op": "next", "id": self.next_id})
+
+    def import_tasks(self, tasks: List[Dict]) -> None:
+        self.wait()
+        state = JournalState()
+        for task in sorted(unique_tasks(tasks), key=lambda task: task["id"]):
+            state.apply({"op": "add", "task": task})
+        state.next_id = max(state.next_id, self.next_id)
+        # Nothing of the current journal is carried over
+        self.rewrite(state, os.path.getsize(self.path))
+        self.items, self.ordinals, self.next_id = state.items, state.ordinals, state.next_id
+        self.index = DueDateIndex(list(self.items.values()), list(self.ordinals.values()))
+
+    def by_due_date(self) -> List[Dict]:
+        return [dict(task) for task in self.index.ordered()]
+
+    def due_between(self, start: str, end: str) -> List[Dict]:
+        return [dict(task) for task in self.index.between(due_ordinal(start), due_ordinal(end))]
+
+    def close(self) -> None:
+        self.wait()
+        self.file.close()
+
+# One row per task in a SQLite table; each change is a single statement, ids come from a stored counter
+class SQLiteStore(TaskStore):
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY, description TEXT, due_date TEXT, category TEXT, due_ordinal INTEGER)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(tasks)")]
+        if "due_ordinal" not in columns:
+            # A database from before the due date index
+            self.db.create_function("due_ordinal", 1, due_ordinal)
+            self.db.execute("ALTER TABLE tasks ADD COLUMN due_ordinal INTEGER")
+            self.db.execute("UPDATE tasks SET due_ordinal = due_ordinal(due_date)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due_ordinal, id)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.db.execute("INSERT OR IGNORE INTO counters SELECT 'next_id', COALESCE(MAX(id), 0) + 1 FROM tasks")
+
+    def select(self, where: str = "", order: str = "id", parameters: tuple = ()) -> List[Dict]:
+        rows = self.db.execute(f"SELECT id, description, due_date, category FROM tasks {where} ORDER BY {order}", parameters)
+        return [{"id": id_, "description": description, "due_date": due_date, "category": category}
+                for id_, description, due_date, category in rows]
+
+    def insert(self, tasks: List[Dict]) -> None:
+        self.db.executemany(
+            "INSERT INTO tasks (id, description, due_date, category, due_ordinal) VALUES (?, ?, ?, ?, ?)",
+            [(task["id"], task["description"], task["due_date"], task["category"], due_ordinal(task["due_date"]))
+             for task in tasks],
+        )
+
+    def tasks(self) -> List[Dict]:
+        return self.select()
+
+    def transaction(self, work: Callable[[], None]) -> None:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            work()
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def add(self, description, due_date, category) -> Dict:
+        task = {"description": description, "due_date": due_date, "category": category}
+
+        def insert() -> None:
+            (task["id"],) = self.db.execute("SELECT value FROM counters WHERE name = 'next_id'").fetchone()
+            self.db.execute("UPDATE counters SET value = value + 1 WHERE name = 'next_id'")
+            self.insert([task])
+
+        self.transaction(insert)
+        return {"id": task["id"], "description": description, "due_date": due_date, "category": category}
+
+    def delete(self, task_id) -> bool:
+        return self.db.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount > 0
+
+    def clear(self) -> None:
+        self.db.execute("DELETE FROM tasks")
+
+    def import_tasks(self, tasks: List[Dict]) -> None:
+        def replace() -> None:
+            self.db.execute("DELETE FROM tasks")
+            self.insert(unique_tasks(tasks))
+            self.db.execute(
+                "UPDATE counters SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) + 1 FROM tasks)) WHERE name = 'next_id'"
+            )
+
+        self.transaction(replace)
+
+    def by_due_date(self) -> List[Dict]:
+        return self.select(order="due_ordinal, id")
+
+    def due_between(self, start: str, end: str) -> List[Dict]:
+        return self.select("WHERE due_ordinal BETWEEN ? AND ?", "due_ordinal, id", (due_ordinal(start), due_ordinal(end)))
+
+    def close(self) -> None:
+        self.db.close()
+
+BACKENDS = {"json": JsonStore, "journal": JournalStore, "sqlite": SQLiteStore}
+DEFAULT_PATHS = {"json": "tasks.json", "journal": "tasks.jsonl", "sqlite": "tasks.sqlite3"}
+
+# Open a backend by name; a new journal or database starts from the tasks.json export if there is one
+def open_store(backend: str = "json", path: Optional[str] = None, import_file: Optional[str] = "tasks.json") -> TaskStore:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown task storage backend: {backend} (choose from {', '.join(BACKENDS)})")
+    path = path or DEFAULT_PATHS[backend]
+    fresh = not os.path.exists(path)
+    store = BACKENDS[backend](path)
+    if backend != "json" and fresh and import_file and os.path.exists(import_file):
+        store.import_tasks(JsonStore(import_file).tasks())
+    return store
@@ -0,0 +1,31 @@
+import ast
+
+from AST_Annotator import tree_records
+
+SOURCE = '''
+x = [1, {"a": (lambda: 2)}]
+def f(a):
+    try:
+        y = 1
+    except ValueError:
+        z = "a"
+    match a:
+        case 1:
+            w = 1.0
+class C:
+    def g(self) -> int:
+        v = []
+'''
+
+def test_records_come_in_breadth_first_order():
+    records = tree_records("m.py", ast.parse(SOURCE))
+    assert [(record.qualname, record.kind, record.name, record.type) for record in records] == [
+        ("", "variable", "x", "List[int, Dict[str : Unknown]]"),
+        ("f", "argument", "a", "Missing Type Hint"),
+        ("f", "return", "f", "Missing Return Type Hint"),
+        ("C.g", "argument", "self", "Missing Type Hint"),
+        ("f", "variable", "y", "int"),
+        ("C.g", "variable", "v", "List[]"),
+        ("f", "variable", "z", "str"),
+        ("f", "variable", "w", "float"),
+    ]
@@ -0,0 +1,26 @@
+from conditional_annotator import MAX_TYPE_DEPTH, infer_runtime_types, sample_elements
+
+def test_nested_containers():
+    assert infer_runtime_types([1, "a", [2.0]]) == "List[int, str, List[float]]"
+    assert infer_runtime_types({"a": 1, "b": [True]}) == "Dict[str, int, List[bool]]"
+    assert infer_runtime_types([]) == "List[Any]"
+
+def test_results_cut_short_by_a_cycle_are_not_memoized():
+    inner, outer = {}, {}
+    inner["outer"], outer["inner"] = outer, inner
+    memo = {}
+    assert infer_runtime_types(outer, memo) == "Dict[str, Dict[str, Any]]"
+    assert memo == {}
+    shared = [1]
+    assert infer_runtime_types([shared, shared], memo) == "List[List[int]]"
+    assert memo[id(shared)] == "List[int]"
+
+def test_deep_nesting_does_not_recurse():
+    value = []
+    for _ in range(100_000):
+        value = [value]
+    assert infer_runtime_types(value) == "List[" * (MAX_TYPE_DEPTH + 1) + "Any" + "]" * (MAX_TYPE_DEPTH + 1)
+
+def test_large_dicts_are_sampled_from_both_ends():
+    items = {i: str(i) for i in range(1000)}
+    assert [key for key, _ in sample_elements(items, 4, None)] == [0, 1, 998, 999]
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from discovery import ExcludeRules, iter_python_files, translate
+
+@pytest.mark.parametrize("pattern, matches, misses", [
+    ("*.py", ["a.py", "pkg/a.py"], ["a.pyc", "a.py/b"]),
+    ("build/*.py", ["build/a.py"], ["src/build/a.py", "build/sub/a.py"]),
+    ("**/gen/*.py", ["gen/a.py", "src/gen/a.py"], ["gen.py"]),
+    ("a?.py", ["ab.py"], ["a.py", "a/.py"]),
+    ("[ab].py", ["a.py", "b.py"], ["c.py"]),
+    ("[!ab].py", ["c.py"], ["a.py", "b.py", "/.py"]),
+    ("[^ab].py", ["c.py"], ["a.py"]),
+    ("[a!].py", ["a.py", "!.py"], ["^.py", "b.py"]),
+    ("[a^].py", ["^.py"], ["b.py"]),
+    ("[a-c].py", ["b.py"], ["d.py", "-.py"]),
+    ("[]a].py", ["].py", "a.py"], ["b.py"]),
+    ("[!]].py", ["a.py"], ["].py"]),
+    ("[\\[].py", ["[.py", "\\.py"], ["a.py"]),
+    ("x[ab", ["x[ab"], ["xa"]),
+])
+def test_translate(pattern, matches, misses):
+    regex = translate(pattern)
+    for path in matches:
+        assert regex.fullmatch(path), path
+    for path in misses:
+        assert not regex.fullmatch(path), path
+
+def test_last_matching_rule_decides():
+    rules = ExcludeRules(["gen/", "*.py", "!keep.py"])
+    assert rules.excluded("a.py")
+    assert not rules.excluded("sub/keep.py")
+    assert rules.excluded("gen", is_dir=True)
+    assert not rules.excluded("gen")
+
+def test_walks_and_globs_match_from_the_same_base(tmp_path, monkeypatch):
+    for rel_path in ("src/gen/a.py", "src/b.py", "other/gen/c.py"):
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    monkeypatch.chdir(tmp_path)
+
+    walked = sorted(iter_python_files(["src", "other"], ["src/gen/"]))
+    globbed = sorted(iter_python_files(["*/**/*.py"], ["src/gen/"]))
+    assert walked == [os.path.join("other", "gen", "c.py"), os.path.join("src", "b.py")]
+    assert globbed == ["other/gen/c.py", "src/b.py"]
+
+def test_glob_matches_come_sorted(tmp_path, monkeypatch):
+    for name in ("c.py", "a.py", "b.py"):
+        (tmp_path / name).write_text("")
+    monkeypatch.chdir(tmp_path)
+    assert list(iter_python_files(["*.py"])) == ["a.py", "b.py", "c.py"]
@@ -0,0 +1,70 @@
+import csv
+
+import pytest
+
+import generate_csv
+from records import AST_RECORDS, CONDITIONAL_RECORDS, AnnotationRecord, stage_path, write_records
+
+def read_report(path):
+    with open(path, newline="") as file:
+        return list(csv.reader(file))[1:]
+
+def test_splice_replaces_appends_and_drops_module_rows(tmp_path):
+    path = str(tmp_path / "report.csv")
+    generate_csv.write_report([
+        ["a.py", "f", "int", "", "", "AST", "", ""],
+        ["b.py", "g", "str", "", "", "AST", "", ""],
+        ["a.py", "", "", "", "", "var_annotator", "x", "int"],
+        ["c.py", "h", "int", "", "", "AST", "", ""],
+    ], path)
+
+    generate_csv.splice_report([
+        ["a.py", "f", "str", "", "", "AST", "", ""],
+        ["a.py", "f", "str", "", "", "Conditional", "", ""],
+    ], {"a.py", "c.py"}, path)
+
+    assert read_report(path) == [
+        ["1", "a.py", "f", "str", "", "", "AST", "", ""],
+        ["2", "b.py", "g", "str", "", "", "AST", "", ""],
+        ["3", "a.py", "f", "str", "", "", "Conditional", "", ""],
+    ]
+
+def test_splice_without_a_report_writes_one(tmp_path):
+    path = str(tmp_path / "report.csv")
+    generate_csv.splice_report([["a.py", "f", "int", "", "", "AST", "", ""]], {"a.py"}, path)
+    assert read_report(path) == [["1", "a.py", "f", "int", "", "", "AST", "", ""]]
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(generate_csv, "righttyper_path", str(tmp_path / "righttyper.out"))
+    source = tmp_path / "mod.py"
+    source.write_text("x = 1\n")
+    return str(source)
+
+def write_stage_records(source, ast=(), conditional=(), variables=()):
+    write_records(stage_path(source, AST_RECORDS), ast)
+    write_records(stage_path(source, CONDITIONAL_RECORDS), conditional)
+    write_records(generate_csv.variable_record_file, variables)
+
+def test_collect_rows_reads_the_records_next_to_the_sources(project):
+    write_stage_records(
+        project,
+        ast=[AnnotationRecord(project, "AST", "", 1, "variable", "x", "int")],
+        variables=[
+            AnnotationRecord(project, "var_annotator", "", 1, "variable", "x", "int"),
+            AnnotationRecord("other.py", "var_annotator", "", 1, "variable", "y", "str"),
+        ],
+    )
+    assert list(generate_csv.collect_rows([project])) == [
+        ["mod.py", "x", "int", "", "", "AST", "", ""],
+        ["mod.py", "", "", "", "", "var_annotator", "x", "int"],
+    ]
+
+def test_collect_rows_refuses_missing_stage_output(project):
+    write_records(stage_path(project, AST_RECORDS), [])
+    with pytest.raises(FileNotFoundError, match="mod_conditional_records.jsonl"):
+        list(generate_csv.collect_rows([project]))
+
+def test_collect_rows_yields_nothing_for_deleted_sources(project, tmp_path):
+    assert list(generate_csv.collect_rows([str(tmp_path / "gone.py")])) == []
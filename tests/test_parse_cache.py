@@ -0,0 +1,59 @@
+import pytest
+
+import parse_cache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    parse_cache.clear()
+    yield
+    parse_cache.clear()
+
+def write_modules(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"module{i}.py"
+        path.write_text(f"x = {i}\n")
+        paths.append(str(path))
+    return paths
+
+def test_trees_are_reused_and_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, "MAX_TREES", 2)
+    first, second, third = write_modules(tmp_path, 3)
+    tree = parse_cache.get_tree(first)
+    parse_cache.get_tree(second)
+    assert parse_cache.get_tree(first) is tree
+    # The least recently used tree (second) makes room for the third.
+    parse_cache.get_tree(third)
+    assert parse_cache.get_tree(first) is tree
+    assert len(parse_cache._trees) == 2
+    assert [path for path, _ in parse_cache._trees] == [third, first]
+
+def test_sources_are_bounded_by_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, "MAX_SOURCE_CHARS", 12)
+    paths = write_modules(tmp_path, 3)
+    for path in paths:
+        parse_cache.read_source(path)
+    assert list(parse_cache._sources) == paths[1:]
+    assert parse_cache._source_chars == 12
+
+def test_changed_file_is_read_again(tmp_path):
+    (path,) = write_modules(tmp_path, 1)
+    source, digest = parse_cache.read_source(path)
+    with open(path, "a") as file:
+        file.write("y = 1\n")
+    assert parse_cache.read_source(path)[0] == source + "y = 1\n"
+    assert parse_cache._source_chars == len(source) + 6
+
+def test_bounds_grow_to_hold_a_run_within_the_memory_share(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, "MAX_TREES", 2)
+    monkeypatch.setattr(parse_cache, "MAX_SOURCE_CHARS", 1)
+    monkeypatch.setattr(parse_cache, "TREE_BYTES_PER_CHAR", 10)
+    monkeypatch.setattr(parse_cache, "MEMORY_SHARE", 1)
+    paths = write_modules(tmp_path, 6)
+    # Six 6-character files: 36 characters of source and 60 bytes per tree.
+    monkeypatch.setattr(parse_cache, "available_memory", lambda: 36 + 4 * 60)
+    parse_cache.size_for(paths)
+    assert (parse_cache.MAX_TREES, parse_cache.MAX_SOURCE_CHARS) == (4, 36)
+    monkeypatch.setattr(parse_cache, "available_memory", lambda: 10 ** 9)
+    parse_cache.size_for(paths)
+    assert parse_cache.MAX_TREES == 6
@@ -0,0 +1,29 @@
+from return_index import build_return_index
+from var_annotator import project_analysis, report_rows
+
+def write_project(tmp_path):
+    for rel_path, source in {
+        "pkg/__init__.py": "",
+        "pkg/b.py": "def make():\n    return []\n",
+        "pkg/a.py": "from pkg.b import make\n\ndef value():\n    return make()\n",
+        "main.py": "from pkg.a import value\n\nr = value()\n",
+        "other.py": "x = 1\n",
+    }.items():
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    return [str(tmp_path / name) for name in ("pkg/__init__.py", "pkg/b.py", "pkg/a.py", "main.py", "other.py")]
+
+def test_dependents_are_the_transitive_importers(tmp_path):
+    files = write_project(tmp_path)
+    index = build_return_index(files)
+    assert index.dependents([files[1]]) == {files[2], files[3]}
+    assert index.dependents([files[3]]) == set()
+
+def test_calls_resolve_through_the_whole_project_index(tmp_path):
+    files = write_project(tmp_path)
+    main = files[3]
+    _, alone = project_analysis([main])
+    _, in_project = project_analysis([main], index_files=files)
+    assert report_rows(alone(main)) == [(main, "", 3, "r", "function_call")]
+    assert report_rows(in_project(main)) == [(main, "", 3, "r", "list")]
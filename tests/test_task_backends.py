@@ -0,0 +1,86 @@
+import pytest
+
+from task_store import BACKENDS, DEFAULT_PATHS, JsonStore, TaskStore, open_store
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    return request.param
+
+@pytest.fixture
+def open_backend(backend, tmp_path):
+    stores = []
+
+    def open_() -> TaskStore:
+        store = open_store(backend, str(tmp_path / DEFAULT_PATHS[backend]), import_file=None)
+        stores.append(store)
+        return store
+
+    yield open_
+    for store in stores:
+        store.close()
+
+def test_task_store_is_abstract():
+    with pytest.raises(TypeError):
+        TaskStore()
+
+def test_add_and_delete_keep_other_ids(open_backend):
+    store = open_backend()
+    for day in (3, 1, 2):
+        store.add(f"task {day}", f"2024-01-0{day}", "work")
+    assert store.delete(1)
+    assert not store.delete(1)
+    assert [task["id"] for task in store.tasks()] == [2, 3]
+    assert store.add("task 4", "2024-01-04", "work")["id"] == 4
+
+def test_due_date_order_and_range(open_backend):
+    store = open_backend()
+    store.add("later", "2024-03-01", "x")
+    store.add("undated", "someday", "x")
+    store.add("sooner", "2024-01-15", "x")
+    store.add("tie", "2024-01-15", "x")
+    assert [task["description"] for task in store.by_due_date()] == ["sooner", "tie", "later", "undated"]
+    assert [task["description"] for task in store.due_between("2024-01-01", "2024-02-29")] == ["sooner", "tie"]
+
+def test_tasks_persist_across_reopening(open_backend):
+    store = open_backend()
+    store.add("a", "2024-01-01", "x")
+    store.add("b", "2024-01-02", "x")
+    store.delete(1)
+    store.close()
+    assert open_backend().tasks() == [{"id": 2, "description": "b", "due_date": "2024-01-02", "category": "x"}]
+
+def test_import_replaces_tasks(open_backend):
+    store = open_backend()
+    store.add("a", "2024-01-01", "x")
+    store.import_tasks([
+        {"id": 5, "description": "b", "due_date": "2024-02-01", "category": "y"},
+        {"id": 7, "description": "c", "due_date": "2024-01-01", "category": "y"},
+    ])
+    assert [task["id"] for task in store.tasks()] == [5, 7]
+    assert [task["id"] for task in store.by_due_date()] == [7, 5]
+    assert store.add("d", "2024-03-01", "y")["id"] == 8
+
+def test_clear_removes_every_task(open_backend):
+    store = open_backend()
+    store.add("a", "2024-01-01", "x")
+    store.clear()
+    assert store.tasks() == []
+    assert store.by_due_date() == []
+
+def test_new_store_is_seeded_from_the_export(backend, tmp_path):
+    export = str(tmp_path / "tasks.json")
+    JsonStore(export).save([{"id": 3, "description": "a", "due_date": "2024-01-01", "category": "x"}])
+    path = export if backend == "json" else str(tmp_path / DEFAULT_PATHS[backend])
+    store = open_store(backend, path, import_file=export)
+    assert [task["id"] for task in store.tasks()] == [3]
+    store.close()
+
+def test_ids_of_deleted_tasks_are_never_reused(open_backend):
+    store = open_backend()
+    store.add("a", "2024-01-01", "x")
+    store.add("b", "2024-01-02", "x")
+    assert store.delete(2)
+    assert store.add("c", "2024-01-03", "x")["id"] == 3
+    store.clear()
+    store.close()
+    assert open_backend().add("d", "2024-01-04", "x")["id"] == 4
@@ -0,0 +1,165 @@
+import json
+import os
+
+import task_store
+from task_store import DueDateIndex, JournalState, JournalStore, JsonStore
+
+def journal_lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+def test_delete_appends_a_tombstone_and_keeps_ids(tmp_path):
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    for day in (3, 1, 2):
+        store.add(f"task {day}", f"2024-01-0{day}", "work")
+    assert store.delete(2)
+    assert not store.delete(2)
+    store.close()
+
+    assert journal_lines(path)[-1] == {"op": "delete", "id": 2}
+    assert [task["id"] for task in store.tasks()] == [1, 3]
+    assert [task["id"] for task in store.by_due_date()] == [3, 1]
+
+def test_index_tombstones_are_squeezed_out():
+    tasks = [{"id": i, "due_date": f"2024-01-{i:02d}"} for i in range(1, 11)]
+    index = DueDateIndex(tasks)
+    for task in tasks[:5]:
+        index.remove(task_store.due_ordinal(task["due_date"]), task)
+    assert index.dead == 5 and len(index.tasks) == 10
+    index.remove(task_store.due_ordinal(tasks[5]["due_date"]), tasks[5])
+    assert index.dead == 0 and len(index.tasks) == 4
+    assert [task["id"] for task in index.between(0, task_store.UNDATED)] == [7, 8, 9, 10]
+
+def test_replay_restores_tasks_and_next_id(tmp_path):
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    store.add("a", "2024-02-01", "x")
+    store.add("b", "not a date", "x")
+    store.delete(2)
+    store.close()
+
+    reopened = JournalStore(path)
+    assert reopened.tasks() == [{"id": 1, "description": "a", "due_date": "2024-02-01", "category": "x"}]
+    # The id of the deleted task is not handed out again
+    assert reopened.add("c", "2024-01-01", "x")["id"] == 3
+    reopened.close()
+
+def test_replay_truncates_a_torn_line(tmp_path):
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    store.add("a", "2024-02-01", "x")
+    store.close()
+    with open(path, "a") as file:
+        file.write('{"op": "add", "task": {"id"')
+
+    reopened = JournalStore(path)
+    reopened.add("b", "2024-02-02", "x")
+    reopened.close()
+    assert [entry["task"]["id"] for entry in journal_lines(path)] == [1, 2]
+
+def test_compaction_rewrites_live_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_store, "COMPACT_MIN_OPS", 10)
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    for i in range(20):
+        store.add(f"task {i}", "2024-01-01", "x")
+    for task_id in range(1, 16):
+        store.delete(task_id)
+    store.wait()
+    expected = store.tasks()
+    store.close()
+
+    assert len(journal_lines(path)) < 35
+    assert not os.path.exists(path + ".tmp")
+    reopened = JournalStore(path)
+    assert reopened.tasks() == expected
+    assert reopened.next_id == 21
+    reopened.close()
+
+def test_compaction_carries_over_lines_appended_meanwhile(tmp_path):
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    for i in range(4):
+        store.add(f"task {i}", "2024-01-01", "x")
+    store.delete(1)
+    end = store.file.tell()
+    # Appended after the compaction took the journal length
+    store.add("late", "2024-01-02", "x")
+    store.delete(2)
+    store.compact(end)
+    store.close()
+
+    assert journal_lines(path) == [
+        {"op": "next", "id": 5},
+        {"op": "add", "task": {"id": 2, "description": "task 1", "due_date": "2024-01-01", "category": "x"},
+         "due": task_store.due_ordinal("2024-01-01")},
+        {"op": "add", "task": {"id": 3, "description": "task 2", "due_date": "2024-01-01", "category": "x"},
+         "due": task_store.due_ordinal("2024-01-01")},
+        {"op": "add", "task": {"id": 4, "description": "task 3", "due_date": "2024-01-01", "category": "x"},
+         "due": task_store.due_ordinal("2024-01-01")},
+        {"op": "add", "task": {"id": 5, "description": "late", "due_date": "2024-01-02", "category": "x"},
+         "due": task_store.due_ordinal("2024-01-02")},
+        {"op": "delete", "id": 2},
+    ]
+    assert [task["id"] for task in JournalStore(path).tasks()] == [3, 4, 5]
+
+def test_failed_compaction_keeps_the_journal(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    store.add("a", "2024-01-01", "x")
+    store.delete(1)
+    with open(path) as file:
+        before = file.read()
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    store.compact(store.file.tell())
+    monkeypatch.undo()
+
+    assert "disk full" in capsys.readouterr().out
+    assert store.compactor is None
+    assert store.compact_at == store.ops + task_store.COMPACT_MIN_OPS
+    assert not os.path.exists(path + ".tmp")
+    with open(path) as file:
+        assert file.read() == before
+    store.add("b", "2024-01-01", "x")
+    store.close()
+    assert [task["id"] for task in JournalStore(path).tasks()] == [2]
+
+def test_import_keeps_the_last_task_of_a_duplicate_id(tmp_path):
+    store = JournalStore(str(tmp_path / "tasks.jsonl"))
+    store.import_tasks([
+        {"id": 2, "description": "old", "due_date": "2024-01-02", "category": "x"},
+        {"id": 1, "description": "a", "due_date": "2024-01-03", "category": "x"},
+        {"id": 2, "description": "new", "due_date": "2024-01-01", "category": "x"},
+    ])
+    assert [task["description"] for task in store.by_due_date()] == ["new", "a"]
+    assert store.add("b", "2024-01-04", "x")["id"] == 3
+    store.close()
+
+def test_state_replays_up_to_an_offset(tmp_path):
+    path = str(tmp_path / "tasks.jsonl")
+    store = JournalStore(path)
+    store.add("a", "2024-01-01", "x")
+    end = store.file.tell()
+    store.add("b", "2024-01-01", "x")
+    store.close()
+
+    state = JournalState()
+    assert state.replay(path, end) == end
+    assert list(state.items) == [1] and state.next_id == 2
+
+def test_json_due_date_index_is_kept_until_the_file_changes(tmp_path):
+    store = JsonStore(str(tmp_path / "tasks.json"))
+    store.add("a", "2024-02-01", "x")
+    assert [task["id"] for task in store.by_due_date()] == [1]
+    index = store.index()
+    store.by_due_date()[0]["description"] = "changed by the caller"
+    assert store.due_between("2024-01-01", "2024-12-31")[0]["description"] == "a"
+    assert store.index() is index
+    # Another process rewriting the file
+    JsonStore(store.path).add("b", "2024-01-01", "x")
+    assert [task["id"] for task in store.by_due_date()] == [2, 1]
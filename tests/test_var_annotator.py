@@ -0,0 +1,24 @@
+from var_annotator import SymbolTable, analyze_file
+
+def test_symbol_table_keeps_one_row_per_binding_site():
+    table = SymbolTable()
+    table.add("", 1, "variable", "x", "int")
+    table.add("", 2, "variable", "x", "str")
+    table.add("", 2, "variable", "x", "list")
+    assert list(table) == [("", 1, "variable", "x", "int"), ("", 2, "variable", "x", "list")]
+    assert table.lookup("", "x") == "list"
+
+def test_report_has_a_row_per_rebinding(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text('x = 1\nx = "a"\ndef f():\n    x = []\n    return x\n')
+    assert analyze_file(str(path)) == [
+        (str(path), "", 1, "x", "int"),
+        (str(path), "", 2, "x", "str"),
+        (str(path), "f", 4, "x", "list"),
+    ]
+
+def test_syntax_errors_are_reported_and_skipped(tmp_path, capsys):
+    path = tmp_path / "py2.py"
+    path.write_text('print "py2"\n')
+    assert analyze_file(str(path)) == []
+    assert "Error reading file" in capsys.readouterr().out
@@ -1,56 +1,287 @@
+import argparse
 import ast
 import csv
+import hashlib
 import sys
-from typing import Dict, List, Tuple
+from array import array
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import metrics
+import parse_cache
+from discovery import add_discovery_arguments, discover, exclude_patterns, iter_python_files
+from parallel import analyze_files
+from parse_cache import get_tree, read_source
+from records import AnnotationRecord, write_records
+from result_cache import ResultCache, add_cache_arguments, open_cache
+from return_index import BUILTIN_RETURN_TYPES, ReturnTypeIndex, build_return_index, dotted_name, literal_type
+
+# Bump whenever the rows produced for a given source change, to invalidate cached results.
+ANALYZER_VERSION = "var_annotator/6"
+# Result-cache namespace of per-function records, keyed by source-span fingerprint
+UNIT_ANALYZER = f"{ANALYZER_VERSION}/function"
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+class SymbolTable:
+    # Every binding as a (qualname, lineno, kind, name, type) row, one per binding site (qualname, name, lineno):
+    # rebinding a name elsewhere adds a row, rebinding it on the same line replaces the type of that line's row.
+    # Strings are interned into one pool and each column is a typed array, so a row costs
+    # five machine integers rather than a tuple of objects.
 
-class VariableTypeInferer(ast.NodeVisitor):
     def __init__(self):
-        # Holds variables with their inferred types (global scope or function parameters)
-        self.variables: Dict[str, str] = {}
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.qualnames = array("I")
+        self.linenos = array("I")
+        self.kinds = array("I")
+        self.names = array("I")
+        self.types = array("I")
+        # (qualname id << 32 | name id) -> row of the latest binding of that name in that scope, which is
+        # what later uses of the name see
+        self.latest: Dict[int, int] = {}
+
+    def intern(self, string: str) -> int:
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(sys.intern(string))
+        return string_id
+
+    def add(self, qualname: str, lineno: int, kind: str, name: str, type_name: str) -> None:
+        qualname_id, name_id = self.intern(qualname), self.intern(name)
+        key = qualname_id << 32 | name_id
+        row = self.latest.get(key)
+        if row is not None and self.linenos[row] == lineno:
+            # Same binding site as the latest binding (e.g. `x = 1; x = ""`): the last one wins
+            self.kinds[row] = self.intern(kind)
+            self.types[row] = self.intern(type_name)
+            return
+        self.latest[key] = len(self.linenos)
+        self.qualnames.append(qualname_id)
+        self.linenos.append(lineno)
+        self.kinds.append(self.intern(kind))
+        self.names.append(name_id)
+        self.types.append(self.intern(type_name))
+
+    def find(self, qualname: str, name: str) -> Optional[int]:
+        # Row of the latest binding of a name in exactly this scope, if any
+        qualname_id, name_id = self.string_ids.get(qualname), self.string_ids.get(name)
+        if qualname_id is None or name_id is None:
+            return None
+        return self.latest.get(qualname_id << 32 | name_id)
+
+    def lookup(self, qualname: str, name: str) -> Optional[str]:
+        # Type of the latest binding of a name in exactly this scope, if any
+        row = self.find(qualname, name)
+        return None if row is None else self.strings[self.types[row]]
+
+    def row(self, index: int) -> Tuple[str, int, str, str, str]:
+        strings = self.strings
+        return (strings[self.qualnames[index]], self.linenos[index], strings[self.kinds[index]],
+                strings[self.names[index]], strings[self.types[index]])
+
+    def __len__(self) -> int:
+        return len(self.linenos)
+
+    def __iter__(self) -> Iterator[Tuple[str, int, str, str, str]]:
+        return map(self.row, range(len(self.linenos)))
+
+class VariableTypeInferer(ast.NodeVisitor):
+    def __init__(self, filepath: str = "", return_index: Optional[ReturnTypeIndex] = None,
+                 store: Optional[ResultCache] = None):
+        # File being visited and the project's return types, to resolve calls across modules
+        self.filepath = filepath
+        self.return_index = return_index
+        # Results of unchanged functions from earlier runs, keyed by the fingerprint of their source span
+        self.store = store
+        self.source_lines: Optional[List[str]] = None
+        # What the function being inferred read from outside itself, while inferring a stored unit
+        self.dependencies: Optional[List[list]] = None
+        self.unit_start = 0
+        # Stored units fetched in one query up front, and newly inferred ones written in one transaction
+        self.fetched: Set[str] = set()
+        self.stored_units: Dict[str, List[list]] = {}
+        self.inferred_units: Dict[str, List[list]] = {}
         # Map for known function return types
         self.function_return_types: Dict[str, str] = {}
+        # Every binding, scope-aware, in visiting order (one traversal fills it)
+        self.records = SymbolTable()
+        # Qualnames of the enclosing classes and functions, innermost last
+        self.scope: List[str] = []
+        # Qualnames of the classes among them, whose names methods do not see
+        self.class_scopes: Set[str] = set()
+
+    @property
+    def qualname(self) -> str:
+        return self.scope[-1] if self.scope else ""
+
+    def enter_scope(self, name: str) -> None:
+        self.scope.append(f"{self.qualname}.{name}" if self.scope else name)
     
     def visit_Assign(self, node: ast.Assign):
         # Process each assignment target
         for target in node.targets:
             if isinstance(target, ast.Name):
                 inferred_type = self.infer_type(node.value, target.id)
-                # Overwrite if already present to ensure consistency
-                self.variables[target.id] = inferred_type
+                # A later binding in the same scope is what lookups see
+                self.records.add(self.qualname, node.lineno, "variable", target.id, inferred_type)
         self.generic_visit(node)
     
-    def visit_FunctionDef(self, node: ast.FunctionDef):
+    def visit_Module(self, node: ast.Module):
+        if self.store is None:
+            self.generic_visit(node)
+            return
+        self.fetched = set(self.unit_fingerprints(node))
+        self.stored_units = self.store.get_many(UNIT_ANALYZER, self.fetched)
+        self.generic_visit(node)
+        if self.inferred_units:
+            self.store.put_many(UNIT_ANALYZER, self.inferred_units)
+
+    def visit_FunctionDef(self, node: FunctionNode):
+        # Top-level functions and methods are the units of incremental re-analysis
+        if self.store is not None and self.dependencies is None and all(q in self.class_scopes for q in self.scope):
+            self.visit_unit(node)
+            return
+        self.enter_scope(node.name)
         # Process function parameters: we mark them as 'function_param' if not further inferred.
         for arg in node.args.args:
-            self.variables[arg.arg] = "function_param"
+            self.records.add(self.qualname, arg.lineno, "argument", arg.arg, "function_param")
         # Attempt to infer the function's return type from its return statements.
         return_type = self.infer_function_return_type(node)
+        if self.return_index is not None:
+            solved = self.return_index.function_type(self.filepath, self.qualname)
+            if self.dependencies is not None:
+                self.dependencies.append(["return", self.qualname, solved])
+            return_type = solved or return_type
         self.function_return_types[node.name] = return_type
         self.generic_visit(node)
+        self.scope.pop()
+    
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self.visit_FunctionDef(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.enter_scope(node.name)
+        self.class_scopes.add(self.qualname)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visible_scopes(self) -> List[str]:
+        # Scopes whose names the current scope sees: enclosing ones innermost first (class bodies only
+        # from inside themselves), then the module
+        scopes = [q for q in reversed(self.scope) if q not in self.class_scopes or q == self.qualname]
+        scopes.append("")
+        return scopes
+
+    def lookup(self, name: str) -> Optional[str]:
+        # Type of a name as seen from the current scope
+        scopes = self.visible_scopes()
+        for qualname in scopes:
+            row = self.records.find(qualname, name)
+            if row is not None:
+                break
+        found = None if row is None else self.records.strings[self.records.types[row]]
+        if self.dependencies is not None and (row is None or row < self.unit_start):
+            # Bound outside the unit being inferred: its result holds only while this does
+            self.dependencies.append(["name", scopes, name, found])
+        return found
+
+    def unit_fingerprint(self, node: FunctionNode, scope: str) -> str:
+        # Hash of a function's source span (decorators included) and of what its records depend on
+        if self.source_lines is None:
+            # The source has universal newlines; str.splitlines would also split on \f, \v, \x85, ...
+            # and shift the span away from the tokenizer's line numbers
+            self.source_lines = read_source(self.filepath)[0].split("\n")
+        start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        span = "\n".join(self.source_lines[start - 1:node.end_lineno])
+        key = "\0".join([ANALYZER_VERSION, str(self.return_index is not None), scope, node.name, span])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def unit_fingerprints(self, tree: ast.Module) -> Iterator[str]:
+        # Fingerprints of the module's units, found without descending into any function
+        todo = [(tree, "")]
+        while todo:
+            node, scope = todo.pop()
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    yield self.unit_fingerprint(child, scope)
+                elif isinstance(child, ast.ClassDef):
+                    todo.append((child, f"{scope}.{child.name}" if scope else child.name))
+                else:
+                    todo.append((child, scope))
+
+    def dependencies_hold(self, dependencies: List[list]) -> bool:
+        # Whether every outside name, call and return type a stored unit read still resolves the same
+        for dependency in dependencies:
+            if dependency[0] == "name":
+                _, scopes, name, type_name = dependency
+                found = next((t for t in (self.records.lookup(q, name) for q in scopes) if t is not None), None)
+            elif dependency[0] == "call":
+                _, scope, dotted, type_name = dependency
+                found = self.return_index.name_type(self.filepath, scope, dotted)
+            else:
+                _, qualname, type_name = dependency
+                found = self.return_index.function_type(self.filepath, qualname)
+            if found != type_name:
+                return False
+        return True
+
+    def visit_unit(self, node: FunctionNode) -> None:
+        # Reuses the stored records of an unchanged function whose dependencies still hold, else infers
+        # it and stores them, with line numbers relative to the function so edits above it do not matter
+        start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        fingerprint = self.unit_fingerprint(node, self.qualname)
+        if fingerprint in self.fetched:
+            stored = self.stored_units.get(fingerprint)
+        else:
+            stored = self.store.get(UNIT_ANALYZER, fingerprint)
+        if stored is not None and self.dependencies_hold(stored[0]):
+            for qualname, offset, kind, name, type_name in stored[1]:
+                self.records.add(qualname, start + offset, kind, name, type_name)
+            self.function_return_types.update(stored[2])
+            metrics.count(functions_reused=1)
+            return
+
+        self.dependencies, self.unit_start = [], len(self.records)
+        returns_before = dict(self.function_return_types)
+        try:
+            self.visit_FunctionDef(node)
+            rows = map(self.records.row, range(self.unit_start, len(self.records)))
+            records = [[qualname, lineno - start, kind, name, type_name]
+                       for qualname, lineno, kind, name, type_name in rows]
+            returns = [[name, type_name] for name, type_name in self.function_return_types.items()
+                       if name not in returns_before or returns_before[name] != type_name]
+            self.inferred_units[fingerprint] = [self.dependencies, records, returns]
+        finally:
+            self.dependencies = None
+        metrics.count(functions_inferred=1)
     
     def infer_type(self, node: ast.AST, var_name: str = "") -> str:
-        if isinstance(node, ast.Constant):
-            return type(node.value).__name__
-        elif isinstance(node, ast.List):
-            return "list"
-        elif isinstance(node, ast.Dict):
-            return "dict"
-        elif isinstance(node, ast.Tuple):
-            return "tuple"
-        elif isinstance(node, ast.Set):
-            return "set"
-        elif isinstance(node, ast.ListComp):
-            return "list"
-        elif isinstance(node, ast.DictComp):
-            return "dict"
+        literal = literal_type(node)
+        if literal is not None:
+            return literal
         elif isinstance(node, ast.Call):
+            if self.return_index is not None:
+                # Project functions and classes, solved once for the whole project
+                resolved = self.return_index.call_type(self.filepath, self.qualname, node.func)
+                callee = dotted_name(node.func)
+                if self.dependencies is not None and callee is not None:
+                    self.dependencies.append(["call", self.qualname, callee, resolved])
+                if resolved is not None:
+                    return resolved
             if isinstance(node.func, ast.Name):
                 # Use our mapping to return the known type for specific functions
                 return self.map_function_return_type(node.func.id, var_name)
             return "function_call"
+        elif isinstance(node, ast.Name):
+            # A copy of a name already bound in a visible scope
+            bound = self.lookup(node.id)
+            if bound is not None:
+                return bound
         return "Unknown"
     
-    def infer_function_return_type(self, node: ast.FunctionDef) -> str:
+    def infer_function_return_type(self, node: FunctionNode) -> str:
         # Look for a return statement and infer its type
         for stmt in node.body:
             if isinstance(stmt, ast.Return) and stmt.value is not None:
@@ -58,15 +289,9 @@ class VariableTypeInferer(ast.NodeVisitor):
         return "None"
     
     def map_function_return_type(self, func_name: str, var_name: str) -> str:
-        # Mapping of known functions to their expected return types.
+        # Mapping of known functions to their expected return types, for calls the return index cannot resolve.
         return_type_map = {
-            "input": "str",
-            "int": "int",
-            "float": "float",
-            "list": "list",
-            "dict": "dict",
-            "tuple": "tuple",
-            "set": "set",
+            **BUILTIN_RETURN_TYPES,
             "generate_table": "list",   # Example: if you have a generate_table function
             "list_tasks": "list",         # list_tasks returns the table (a list of lists)\n",
             "load_tasks": "list",         # load_tasks returns a list from json.load\n",
@@ -76,32 +301,113 @@ class VariableTypeInferer(ast.NodeVisitor):
             return "list"
         return return_type_map.get(func_name, "function_call")
 
-def analyze_file(filepath: str) -> List[Tuple[str, str, str]]:
-    with open(filepath, "r", encoding="utf-8") as file:
-        tree = ast.parse(file.read(), filename=filepath)
-    
-    inferer = VariableTypeInferer()
-    inferer.visit(tree)
+# Function-level stores of this process by cache directory; worker processes open their own
+_unit_stores: Dict[str, ResultCache] = {}
+
+def unit_store(cache_dir: str, max_bytes: int) -> ResultCache:
+    store = _unit_stores.get(cache_dir)
+    if store is None:
+        store = _unit_stores[cache_dir] = ResultCache(cache_dir, max_bytes)
+    return store
+
+def variable_records(filepath: str, return_index: Optional[ReturnTypeIndex] = None,
+                     cache_location: Optional[Tuple[str, int]] = None) -> Iterator[AnnotationRecord]:
+    # With a cache location, unchanged functions reuse their stored records instead of being re-inferred.
+    # Records are made from the symbol table's columns as they are consumed, not held in a list
+    with metrics.span("analyze", filepath, stage="var_annotator"):
+        try:
+            tree = get_tree(filepath)
+        except (OSError, SyntaxError, UnicodeDecodeError) as e:
+            print(f"Error reading file: {e}")
+            return iter(())
+
+        with metrics.span("infer"):
+            store = unit_store(*cache_location) if cache_location is not None else None
+            inferer = VariableTypeInferer(filepath, return_index, store)
+            inferer.visit(tree)
     
+    return (AnnotationRecord(filepath, "var_annotator", *record) for record in inferer.records)
+
+def project_analysis(files: List[str], project_index: bool = True, cache: Optional[ResultCache] = None,
+                     index_files: Optional[List[str]] = None) -> Tuple[str, Callable[[str], Iterator[AnnotationRecord]]]:
+    # The cache key and per-file analysis; with project_index, calls resolve through the return index of
+    # index_files (the whole project, when only some of its files are analyzed), by default of the files
+    cache_location = None
+    if cache is not None:
+        # Only the location travels to worker processes; this process reuses the open cache
+        _unit_stores.setdefault(cache.cache_dir, cache)
+        cache_location = (cache.cache_dir, cache.max_bytes)
+    if not project_index:
+        return ANALYZER_VERSION, partial(variable_records, cache_location=cache_location)
+    # The index and the analysis each walk all the files; keep every tree for the second pass
+    parse_cache.size_for([*files, *(index_files or ())])
+    with metrics.span("index", stage="var_annotator"):
+        return_index = build_return_index(files if index_files is None else index_files, cache)
+    # The index is solved from cached per-file facts, so only changed files are parsed for it. Any change
+    # to the index invalidates every file's results; within a file, only the functions whose source or
+    # resolved dependencies changed are re-inferred
+    return (f"{ANALYZER_VERSION}/index={return_index.digest}",
+            partial(variable_records, return_index=return_index, cache_location=cache_location))
+
+def iter_variables(paths: Iterable[str], jobs: int = 1, cache: Optional[ResultCache] = None,
+                   excludes: Iterable[str] = (), project_index: bool = True,
+                   index_files: Optional[List[str]] = None) -> Iterator[AnnotationRecord]:
+    # Yields the records of files, directories or globs, file by file as they are analyzed.
+    # The project index needs every file first; without it, files stream straight from discovery.
+    files = iter_python_files(paths, excludes)
+    if project_index:
+        files = list(files)
+    analyzer, analyze = project_analysis(files, project_index, cache, index_files)
+    for rows in analyze_files(files, analyzer, analyze, jobs, cache):
+        yield from map(AnnotationRecord._make, rows)
+
+def report_rows(records: Iterable[AnnotationRecord]) -> List[Tuple[str, str, int, str, str]]:
+    # One row per binding site (scope, line, name) of a single file, holding the type inferred there
+    variables: Dict[Tuple[str, str, int, str], str] = {}
+    for record in records:
+        variables[record.file, record.qualname, record.lineno, record.name] = record.type
+    return [(filepath, scope, lineno, var, var_type) for (filepath, scope, lineno, var), var_type in variables.items()]
+
+def analyze_file(filepath: str) -> List[Tuple[str, str, int, str, str]]:
     # Build report: each variable with its inferred type
-    return [(filepath, var, var_type) for var, var_type in inferer.variables.items()]
+    return report_rows(variable_records(filepath))
 
-def generate_report(files: List[str], output_file: str):
+def generate_report(files: Iterable[str], output_file: str, cache: Optional[ResultCache] = None, jobs: int = 1,
+                    records_file: str = "variable_annotation_records.jsonl", project_index: bool = True,
+                    index_files: Optional[List[str]] = None):
     results = []
-    for file in files:
-        results.extend(analyze_file(file))
+    records = []
+    if project_index:
+        files = list(files)
+    analyzer, analyze = project_analysis(files, project_index, cache, index_files)
+    for rows in analyze_files(files, analyzer, analyze, jobs, cache):
+        file_records = [AnnotationRecord(*row) for row in rows]
+        results.extend(report_rows(file_records))
+        records.extend(file_records)
     
-    with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
+    with metrics.span("write", output_file, stage="var_annotator"), open(output_file, "w", newline="", encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(["Filename", "Variable Name", "Inferred Type"])
+        writer.writerow(["Filename", "Scope", "Line", "Variable Name", "Inferred Type"])
         writer.writerows(results)
+    write_records(records_file, records)
     
     print(f"✅ Annotation report generated: {output_file}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("❌ Usage: python3 var_annotator.py <file1.py> <file2.py> ...")
-        sys.exit(1)
-    
-    files_to_analyze = sys.argv[1:]
-    generate_report(files_to_analyze, "variable_annotation_report.csv")
+    parser = argparse.ArgumentParser(description="Variable annotation tool.")
+    add_discovery_arguments(parser)
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes (0: one per CPU).")
+    parser.add_argument("--no-project-index", dest="project_index", action="store_false",
+                        help="Do not resolve calls through a project-wide return-type index (lets analysis "
+                             "start while files are still being discovered).")
+    parser.add_argument("--project", action="append", default=[], metavar="PATH",
+                        help="Resolve calls through the return index of these files, directories or globs "
+                             "(repeatable; default: the annotated files), e.g. the whole project when only "
+                             "changed files are annotated.")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    index_files = list(iter_python_files(args.project, exclude_patterns(args))) if args.project else None
+    generate_report(discover(args), "variable_annotation_report.csv", open_cache(args), args.jobs,
+                    project_index=args.project_index, index_files=index_files)